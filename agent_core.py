@@ -1,8 +1,15 @@
 import json
+import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from lexicon import Lexicon, load_pack
 from llm_backends import ollama_chat
-from tools.eligibility import check_eligibility
+from tools.eligibility import check_eligibility, rules_version, explanation_texts, load_rules, rule_index, requote
 from tools.application_store import save_application
+from reco_cache import RecoCache
+from telemetry import span
 
 
 
@@ -17,9 +24,16 @@ def _trace_finalize(memory: dict):
 
 # Step-3 Retriever (safe import)
 try:
-    from tools.retriever import search_schemes
+    from tools.retriever import search_schemes, get_scheme, catalogue_version, schemes as catalogue_schemes
 except Exception:
     search_schemes = None
+    get_scheme = None
+    catalogue_version = None
+    catalogue_schemes = None
+
+def scheme_by_id(scheme_id: str):
+    # rehydrates compact session records (session_store.expand)
+    return get_scheme(scheme_id) if get_scheme is not None else None
 
 
 
@@ -27,50 +41,6 @@ except Exception:
 REQUIRED_FIELDS = ["state", "age", "annual_income", "category", "is_student", "gender"]
 ALLOWED_CATEGORIES = {"sc", "st", "obc", "general", "ews"}
 
-# ----------------------------
-# Normalization (STT fixes)
-# ----------------------------
-def normalize_hi(t: str) -> str:
-    t = t.replace(",", "").replace("₹", "")
-
-    t = (t or "").strip()
-
-    # lakh STT variants
-    t = t.replace("लग", "लाख").replace("लाग", "लाख").replace("लाक", "लाख")
-
-    # scholarship STT variants
-    t = t.replace("चात्र", "छात्र").replace("विती", "वृत्ति").replace("वित", "वृ")
-
-    # common OBC STT variants
-    t = t.replace("अबिसी", "ओबीसी").replace("उबिसी", "ओबीसी").replace("ओ बि सी", "ओबीसी")
-
-    # state STT variants
-    t = t.replace("जारकण", "झारखंड").replace("झारखण्ड", "झारखंड")
-    t = t.replace("बिहाड", "बिहार")
-
-    return t
-
-def parse_choice(text: str, max_n: int):
-    t = normalize_hi(text).strip()
-
-    # digits: "1", "2", "3"
-    m = re.search(r"\b([1-9])\b", t)
-    if m:
-        v = int(m.group(1))
-        return v if 1 <= v <= max_n else None
-
-    # Hindi words
-    if "पहला" in t or "एक" == t:
-        return 1 if max_n >= 1 else None
-    if "दूसरा" in t or "दो" == t:
-        return 2 if max_n >= 2 else None
-    if "तीसरा" in t or "तीन" == t:
-        return 3 if max_n >= 3 else None
-
-    return None
-
-
-
 HINDI_NUM_WORDS = {
     "एक": 1, "दो": 2, "तीन": 3, "चार": 4, "पांच": 5, "पाँच": 5,
     "छह": 6, "सात": 7, "आठ": 8, "नौ": 9, "दस": 10,
@@ -104,6 +74,119 @@ STATE_HI_TO_EN = {
     "असम": "Assam",
 }
 
+# ----------------------------
+# Normalization (STT fixes)
+# ----------------------------
+STT_FIXES_HI = {
+    ",": "", "₹": "",
+    # lakh STT variants
+    "लग": "लाख", "लाग": "लाख", "लाक": "लाख",
+    # scholarship STT variants
+    "चात्र": "छात्र", "विती": "वृत्ति", "वित": "वृ",
+    # common OBC STT variants
+    "अबिसी": "ओबीसी", "उबिसी": "ओबीसी", "ओ बि सी": "ओबीसी",
+    # state STT variants
+    "जारकण": "झारखंड", "झारखण्ड": "झारखंड",
+    "बिहाड": "बिहार",
+}
+
+# surface -> canonical value, per entity kind (checked in this priority order by the parsers)
+YES_NO_HI = {"हाँ": True, "हां": True, "जी": True, "yes": True, "नहीं": False, "नही": False, "no": False}
+GENDER_HI = {"महिला": "female", "औरत": "female", "पुरुष": "male", "लड़का": "male"}
+CATEGORY_HI = {
+    "ओबीसी": "OBC", "obc": "OBC",
+    "एससी": "SC", "sc": "SC",
+    "एसटी": "ST", "st": "ST",
+    "ईडब्ल्यूएस": "EWS", "ews": "EWS",
+    "सामान्य": "General", "जनरल": "General", "general": "General",
+}
+CATEGORY_PRIORITY = ["OBC", "SC", "ST", "EWS", "General"]
+ORDINALS_HI = {"पहला": 1, "दूसरा": 2, "तीसरा": 3}
+
+# words that signal the user is (re)stating a profile field mid-conversation
+FIELD_HINTS_HI = {
+    "age": ["उम्र", "साल"],
+    "annual_income": ["आय", "कमाई", "लाख", "₹", "रुप"],
+    "category": ["श्रेणी", "कैटेगरी", "ओबीसी", "एससी", "एसटी", "ईडब्ल्यूएस", "जनरल", "सामान्य"],
+    "gender": ["लिंग", "महिला", "पुरुष"],
+    "is_student": ["छात्र", "स्टूडेंट"],
+    "state": ["राज्य", "में रहता", "से हूँ", "से हूं"],
+}
+
+def _lexicon_entries():
+    for w, v in HINDI_NUM_WORDS.items():
+        yield w, "number", v
+    for w, v in STATE_HI_TO_EN.items():
+        yield w, "state", v
+    for w, v in YES_NO_HI.items():
+        yield w, "yes_no", v
+    for w, v in GENDER_HI.items():
+        yield w, "gender", v
+    for w, v in CATEGORY_HI.items():
+        yield w, "category", v
+    for w, v in ORDINALS_HI.items():
+        yield w, "ordinal", v
+    for field, words in FIELD_HINTS_HI.items():
+        for w in words:
+            yield w, "hint", field
+    yield "लाख", "unit", 100000
+
+# built once; normalize() and scan() are memoized per utterance
+LEXICON = Lexicon(STT_FIXES_HI, _lexicon_entries())
+
+# UI language name -> code (see app.LANGS); other languages get a lexicon pack
+LANG_CODES = {
+    "Hindi": "hi", "Bengali": "bn", "Tamil": "ta", "Telugu": "te", "Marathi": "mr",
+    "Odia": "or", "Gujarati": "gu", "Kannada": "kn", "Malayalam": "ml", "Punjabi": "pa",
+}
+LEXICON_DIR = Path("data/lexicons")
+_lexicons = {"hi": LEXICON}
+_lexicons_lock = threading.Lock()
+
+def lexicon_for(lang: str = "hi") -> Lexicon:
+    """
+    Hindi/English base + the language's pack, built on first use.
+    The base stays in so code-mixed answers ("मैं OBC हूँ") keep working.
+    """
+    lex = _lexicons.get(lang)
+    if lex is not None:
+        return lex
+    with _lexicons_lock:
+        if lang not in _lexicons:
+            path = LEXICON_DIR / f"{lang}.json"
+            if path.exists():
+                fixes, entries = load_pack(path)
+                _lexicons[lang] = Lexicon({**STT_FIXES_HI, **fixes}, list(_lexicon_entries()) + entries)
+            else:
+                _lexicons[lang] = LEXICON
+        return _lexicons[lang]
+
+def _scan(text: str, lang: str):
+    lex = lexicon_for(lang)
+    return lex.scan(lex.normalize(text))
+
+def normalize_hi(t: str) -> str:
+    return LEXICON.normalize(t or "")
+
+def parse_choice(text: str, max_n: int, lang: str = "hi"):
+    sc = _scan(text, lang)
+    t = sc.text
+
+    # digits: "1", "2", "3"
+    m = re.search(r"\b([1-9])\b", t)
+    if m:
+        v = int(m.group(1))
+        return v if 1 <= v <= max_n else None
+
+    # words: ordinals anywhere ("पहला"), or just the number ("दो")
+    for v in (1, 2, 3):
+        if sc.has("ordinal", v) or sc.whole("number") == v:
+            return v if max_n >= v else None
+
+    return None
+
+
+
 # ----------------------------
 # Optional LLM extraction (only when ef is None)
 # ----------------------------
@@ -135,92 +218,126 @@ def llm_extract_profile(user_text: str, lang_name: str):
 # ----------------------------
 # Parsers
 # ----------------------------
-def parse_age(text: str):
-    text = normalize_hi(text)
-    m = re.search(r"(\d{1,3})", text)
-    if m:
-        v = int(m.group(1))
+def parse_age(text: str, lang: str = "hi"):
+    sc = _scan(text, lang)
+    if sc.numbers:
+        v = int(re.match(r"\d{1,3}", sc.numbers[0][2]).group(0))
+        return v if 1 <= v <= 120 else None
+    v = sc.first_number()
+    if v is not None:
         return v if 1 <= v <= 120 else None
-    for w, v in HINDI_NUM_WORDS.items():
-        if w in text:
-            return v if 1 <= v <= 120 else None
     return None
 
-def parse_income(text: str):
-    text = normalize_hi(text)
+def parse_income(text: str, lang: str = "hi"):
+    sc = _scan(text, lang)
 
-    m = re.search(r"(\d{4,9})", text)
-    if m:
-        v = int(m.group(1))
-        return v if 1000 <= v <= 10**9 else None
+    for _, _, digits in sc.numbers:
+        run = digits.split(".")[0]
+        if len(run) >= 4:
+            v = int(run[:9])
+            return v if 1000 <= v <= 10**9 else None
 
-    if "लाख" in text:
-        m2 = re.search(r"(\d+(\.\d+)?)\s*लाख", text)
-        if m2:
-            return int(float(m2.group(1)) * 100000)
+    if sc.has("unit"):
+        # "2 लाख", "2.5 लाख"
+        units = {s for s, _, k, _ in sc.matches if k == "unit"}
+        for _, e, digits in sc.numbers:
+            rest = sc.text[e:]
+            if e + len(rest) - len(rest.lstrip()) in units:
+                return int(float(digits) * 100000)
 
-        for w, v in HINDI_NUM_WORDS.items():
-            if w in text:
-                return int(v * 100000)
+        v = sc.first_number()
+        if v is not None:
+            return int(v * 100000)
 
     return None
 
-def parse_yes_no(text: str):
-    t = normalize_hi(text).lower()
-    if "हाँ" in t or "हां" in t or "जी" in t or "yes" in t:
+def parse_yes_no(text: str, lang: str = "hi"):
+    vals = _scan(text, lang).values("yes_no")
+    if True in vals:
         return True
-    if "नहीं" in t or "नही" in t or "no" in t:
+    if False in vals:
         return False
     return None
 
-def parse_gender(text: str):
-    t = normalize_hi(text)
-    if "महिला" in t or "औरत" in t:
+def parse_gender(text: str, lang: str = "hi"):
+    vals = _scan(text, lang).values("gender")
+    if "female" in vals:
         return "female"
-    if "पुरुष" in t or "लड़का" in t:
+    if "male" in vals:
         return "male"
     return None
 
-def parse_category(text: str):
-    t = normalize_hi(text).lower()
-    if "ओबीसी" in t or "obc" in t:
-        return "OBC"
-    if "एससी" in t or "sc" in t:
-        return "SC"
-    if "एसटी" in t or "st" in t:
-        return "ST"
-    if "ईडब्ल्यूएस" in t or "ews" in t:
-        return "EWS"
-    if "सामान्य" in t or "जनरल" in t or "general" in t:
-        return "General"
+def parse_category(text: str, lang: str = "hi"):
+    vals = _scan(text, lang).values("category")
+    for c in CATEGORY_PRIORITY:
+        if c in vals:
+            return c
     return None
 
-def parse_state(text: str):
-    t = normalize_hi(text)
-    for hi, en in STATE_HI_TO_EN.items():
-        if hi in t:
-            return en
-    if t in STATE_HI_TO_EN:
-        return STATE_HI_TO_EN[t]
-    return None
+def parse_state(text: str, lang: str = "hi"):
+    return _scan(text, lang).first("state")
+
+def parse_for_slot(text: str, slot: str, lang: str = "hi"):
+    """
+    Run the deterministic parser for an expected answer slot.
+    Used by STT tiering to decide whether a fast transcript is good enough.
+    """
+    if slot == "choice":
+        return parse_choice(text, max_n=3, lang=lang)
+    parser = {
+        "yes_no": parse_yes_no,
+        "is_student": parse_yes_no,
+        "age": parse_age,
+        "annual_income": parse_income,
+        "category": parse_category,
+        "gender": parse_gender,
+        "state": parse_state,
+    }.get(slot)
+    return parser(text, lang) if parser else None
 
 # ----------------------------
 # Prompts
 # ----------------------------
+FIELD_QUESTIONS = {
+    "state": "आप किस राज्य में रहते हैं?",
+    # "age": "आपकी उम्र कितनी है? (उदाहरण: 20)",
+    "age": "आपकी उम्र कितनी है?",
+    # "annual_income": "आपकी सालाना आय लगभग कितनी है? (₹ में, उदाहरण: 200000 या 1 लाख)",
+    "annual_income": "आपकी सालाना आय लगभग कितनी है?",
+    "category": "आपकी श्रेणी क्या है? (SC/ST/OBC/General/EWS)",
+    # "is_student": "क्या आप अभी छात्र/छात्रा हैं? (हाँ/नहीं)",
+    "is_student": "क्या आप अभी छात्र/छात्रा हैं?",
+    "gender": "आपका लिंग क्या है?",
+    # "gender": "आपका लिंग क्या है? (पुरुष/महिला)",
+}
+FIELD_QUESTION_DEFAULT = "कृपया यह जानकारी बताइए।"
+ELIGIBILITY_QUESTION_PREFIX = "इस योजना की पात्रता जांचने के लिए एक सवाल: "
+
+# Fixed replies (no user data inside) -> TTS can pre-render these
+MSG_UPDATED = "ठीक है, मैंने अपडेट कर दिया।"
+MSG_KEPT_OLD = "ठीक है, मैं पहले वाला मान ही रखूँगा।"
+MSG_YES_NO_ONLY = "कृपया सिर्फ 'हाँ' या 'नहीं' में बताइए।"
+MSG_CONFIRM_SUBMIT = "क्या आप आवेदन सबमिट करना चाहते हैं? (हाँ/नहीं)"
+MSG_WHICH_SCHEME = "ठीक है। आप किस योजना की जानकारी चाहते हैं? (1/2/3)"
+MSG_NO_SELECTED = "मुझे आपकी चुनी हुई योजना नहीं मिल रही। कृपया 1/2/3 चुनिए।"
+MSG_PICK_CHOICE = "कृपया 1/2/3 में से चुनिए।"
+MSG_NO_RETRIEVER = "आपकी जानकारी मिल गई। अभी retriever tool सेट नहीं है।"
+MSG_NO_RESULTS = "मुझे अभी कोई उपयुक्त योजना नहीं मिली। आप किस तरह की मदद चाहते हैं (शिक्षा/स्वास्थ्य/घर/नौकरी)?"
+
 def ask_for_field(field: str) -> str:
-    qmap = {
-        "state": "आप किस राज्य में रहते हैं?",
-        # "age": "आपकी उम्र कितनी है? (उदाहरण: 20)",
-        "age": "आपकी उम्र कितनी है?",
-        # "annual_income": "आपकी सालाना आय लगभग कितनी है? (₹ में, उदाहरण: 200000 या 1 लाख)",
-        "annual_income": "आपकी सालाना आय लगभग कितनी है?",
-        "category": "आपकी श्रेणी क्या है? (SC/ST/OBC/General/EWS)",
-        # "is_student": "क्या आप अभी छात्र/छात्रा हैं? (हाँ/नहीं)",
-        "is_student": "क्या आप अभी छात्र/छात्रा हैं?",
-        "gender": "आपका लिंग क्या है?",
-        # "gender": "आपका लिंग क्या है? (पुरुष/महिला)",
-    }
-    return qmap.get(field, "कृपया यह जानकारी बताइए।")
+    return FIELD_QUESTIONS.get(field, FIELD_QUESTION_DEFAULT)
+
+def fixed_prompts():
+    """Every reply that never contains user data (for TTS pre-rendering)."""
+    questions = list(FIELD_QUESTIONS.values()) + [FIELD_QUESTION_DEFAULT]
+    return (
+        questions
+        + [ELIGIBILITY_QUESTION_PREFIX + q for q in questions]
+        + [
+            MSG_UPDATED, MSG_KEPT_OLD, MSG_YES_NO_ONLY, MSG_CONFIRM_SUBMIT, MSG_WHICH_SCHEME,
+            MSG_NO_SELECTED, MSG_PICK_CHOICE, MSG_NO_RETRIEVER, MSG_NO_RESULTS,
+        ]
+    )
 
 def field_label(field: str) -> str:
     return {
@@ -232,6 +349,190 @@ def field_label(field: str) -> str:
         "gender": "लिंग",
     }.get(field, field)
 
+# ----------------------------
+# Recommendation (retrieval + eligibility), cached across sessions
+# ----------------------------
+RETRIEVAL_CACHE = RecoCache()  # (query, catalogue version) -> search results
+RANKED_CACHE = RecoCache()     # (query, catalogue version, rules version, rule outcomes) -> ranked
+
+def _eligibility_tag(e):
+    if e["status"] == "eligible":
+        return "✅ पात्र"
+    if e["status"] == "not_eligible":
+        return "❌ पात्र नहीं"
+    return "⚠️ जानकारी चाहिए"
+
+# ----------------------------
+# Recommendation reply fragments
+# ----------------------------
+# The recommendation list is assembled from pieces formatted once per catalogue /
+# rules load. Each piece is also one TTS chunk (memory["reply_parts"]), so its
+# audio is cached per fragment and shared by every user who gets that scheme.
+MSG_RECO_HEADER = "आपके लिए ये योजनाएँ उपयोगी हो सकती हैं:\n"
+MSG_RECO_FOOTER = "\nआप किस योजना की आवेदन प्रक्रिया जानना चाहते हैं? (1/2/3)"
+ELIGIBILITY_TAGS = ("✅ पात्र", "❌ पात्र नहीं", "⚠️ जानकारी चाहिए")
+RECO_TOP_K = 3
+
+_fragments = {}  # (scheme_id, position, tag) -> item text
+_reasons = {}    # explain_hi -> reason line
+_fragments_key = None
+_fragments_lock = threading.Lock()
+
+def _item_fragment(i: int, r: dict, tag: str) -> str:
+    return f"\n{i}) {r['name_hi']} {tag}\n   - {r['summary_hi']}\n"
+
+def _reason_fragment(explain: str) -> str:
+    return f"   - कारण: {explain}\n"
+
+def _compiled_fragments():
+    global _fragments, _reasons, _fragments_key
+    key = (catalogue_version(), rules_version())
+    if key != _fragments_key:
+        with _fragments_lock:
+            if key != _fragments_key:
+                _fragments = {
+                    (r["scheme_id"], i, tag): _item_fragment(i, r, tag)
+                    for r in catalogue_schemes()
+                    for i in range(1, RECO_TOP_K + 1)
+                    for tag in ELIGIBILITY_TAGS
+                }
+                _reasons = {e: _reason_fragment(e) for e in explanation_texts()}
+                _fragments_key = key
+    return _fragments, _reasons
+
+def recommendation_parts(ranked) -> list:
+    """Reply fragments for ranked [(r, e, tag), ...]; "".join() is the message (without the footer)."""
+    fragments, reasons = _compiled_fragments()
+    parts = [MSG_RECO_HEADER]
+    for i, (r, e, tag) in enumerate(ranked, 1):
+        parts.append(fragments.get((r["scheme_id"], i, tag)) or _item_fragment(i, r, tag))
+        if e.get("checks"):
+            explain = e["checks"][0].get("explain_hi")
+            if explain:
+                # failed checks quote the user's value; those are formatted here
+                parts.append(reasons.get(explain) or _reason_fragment(explain))
+    return parts
+
+def reply_fragments() -> list:
+    """Every recommendation fragment as it is spoken (for TTS pre-rendering)."""
+    texts = [MSG_RECO_HEADER, MSG_RECO_FOOTER]
+    if catalogue_schemes is not None:
+        fragments, reasons = _compiled_fragments()
+        texts += list(fragments.values()) + list(reasons.values())
+    return [t.strip() for t in texts]
+
+# Speculative prefetch: retrieval for the goal runs while intake questions are asked
+RECO_PREFETCH = os.getenv("RECO_PREFETCH", "1") == "1"
+RECO_PREFETCH_WORKERS = int(os.getenv("RECO_PREFETCH_WORKERS", "2"))
+
+# Eligibility-first candidates: retrieve deeper, drop schemes the profile already
+# fails (rule index lookup, not a rule-by-rule check), keep the top 3 of the rest
+RECO_RULE_FILTER = os.getenv("RECO_RULE_FILTER", "0") == "1"
+RECO_CANDIDATE_DEPTH = int(os.getenv("RECO_CANDIDATE_DEPTH", "10"))
+
+_prefetch_pool = None
+_prefetch_lock = threading.Lock()
+_inflight = {}  # query -> Future
+
+def _get_prefetch_pool():
+    # created lazily so a forked worker gets its own threads
+    global _prefetch_pool
+    if _prefetch_pool is None:
+        with _prefetch_lock:
+            if _prefetch_pool is None:
+                _prefetch_pool = ThreadPoolExecutor(RECO_PREFETCH_WORKERS, thread_name_prefix="reco-prefetch")
+    return _prefetch_pool
+
+def prefetch_recommendations(goal: str, profile: dict):
+    """
+    Start retrieval (+ eligibility on the fields known so far) for this goal in
+    the background. Returns the rewritten query, or None if prefetch is off.
+    """
+    if not RECO_PREFETCH or search_schemes is None:
+        return None
+    query = rewrite_query(goal)
+    pool = _get_prefetch_pool()
+    with _prefetch_lock:
+        if query in _inflight:
+            return query
+        fut = pool.submit(rank_schemes, query, dict(profile))
+        _inflight[query] = fut
+    fut.add_done_callback(lambda f, q=query: _inflight.pop(q, None))
+    return query
+
+def _await_prefetch(query: str, trace=None):
+    fut = _inflight.get(query)
+    if fut is None:
+        return
+    if trace is not None:
+        trace.append("retriever=await_prefetch")
+    try:
+        fut.result()
+    except Exception as e:
+        # fall through to a foreground search
+        if trace is not None:
+            trace.append(f"prefetch_error={type(e).__name__}")
+
+def cached_search(query: str, trace=None, top_k: int = 3):
+    if trace is not None:
+        _await_prefetch(query, trace)  # foreground only; the prefetch itself must not wait on itself
+    key = (query, catalogue_version(), top_k)
+    with span("retrieval") as sp:
+        results = RETRIEVAL_CACHE.get(key)
+        sp.set(cache="hit" if results is not None else "miss")
+        if results is None:
+            results = RETRIEVAL_CACHE.put(key, search_schemes(query, top_k=top_k))
+        elif trace is not None:
+            trace.append("retriever=cache_hit")
+    if trace is not None:
+        trace.append(f"retriever.results={len(results)}")
+    return results
+
+def rule_filter(results, profile: dict, trace=None, top_k: int = 3):
+    """
+    Retrieval results minus schemes the profile already fails (missing fields
+    still count as possible; schemes without rules are kept). Falls back to
+    the unfiltered order if nothing is left.
+    """
+    rules_db = load_rules()
+    with span("eligibility.index", candidates=len(results)):
+        possible = rule_index().possible(profile)
+    kept = [r for r in results if r["scheme_id"] in possible or r["scheme_id"] not in rules_db]
+    if trace is not None:
+        trace.append(f"rule_filter={len(kept)}/{len(results)}")
+    return (kept or results)[:top_k]
+
+def rank_schemes(query: str, profile: dict, trace=None):
+    """
+    [(result, eligibility, tag), ...] for the top-3 schemes. Users with the same
+    goal rewrite whose profiles pass, fail and miss the same rules share one
+    entry; fail texts are re-quoted with this user's values on a hit.
+    """
+    key = (query, catalogue_version(), rules_version(), rule_index().outcomes(profile))
+    ranked = RANKED_CACHE.get(key)
+    if ranked is not None:
+        if trace is not None:
+            trace.append("recommend=cache_hit")
+        return [(r, requote(r["scheme_id"], e, profile), tag) for r, e, tag in ranked]
+
+    if RECO_RULE_FILTER:
+        results = rule_filter(cached_search(query, trace, RECO_CANDIDATE_DEPTH), profile, trace)
+    else:
+        results = cached_search(query, trace)
+    ranked = []
+    with span("eligibility", schemes=len(results)):
+        for r in results:
+            if trace is not None:
+                trace.append(f"tool=eligibility({r['scheme_id']})")
+            e = check_eligibility(r["scheme_id"], profile)
+            ranked.append((r, e, _eligibility_tag(e)))
+    RANKED_CACHE.put(key, tuple(ranked))
+    return ranked
+
+def recommend_stats() -> dict:
+    return {"retrieval": RETRIEVAL_CACHE.stats(), "ranked": RANKED_CACHE.stats()}
+
+
 def rewrite_query(q: str) -> str:
     q = normalize_hi(q)
     if ("छात्र" in q) or ("छात्रवृत्ति" in q) or ("स्कॉलर" in q):
@@ -324,6 +625,10 @@ def llm_classify_enum(text: str, field: str, options, lang_name: str):
 # MAIN
 # ----------------------------
 def process_turn(user_text: str, lang_name: str, memory: dict):
+    with span("agent", stage=(memory or {}).get("stage", "INTAKE")):
+        return _process_turn(user_text, lang_name, memory)
+
+def _process_turn(user_text: str, lang_name: str, memory: dict):
     memory = memory or {}
     memory.setdefault("stage", "INTAKE")
     memory.setdefault("profile", {})
@@ -332,6 +637,7 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
     memory.setdefault("goal", None)
     memory.setdefault("last_results", None)       # ranked = [(r,e,tag), ...]
     memory.setdefault("selected_scheme", None)
+    memory.pop("reply_parts", None)               # set only by replies built from fragments
 
     # --- trace setup (per turn) ---
     trace = _trace_reset(memory)
@@ -346,43 +652,46 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
         return (text, memory)
 
     profile = memory["profile"]
-    user_text = normalize_hi(user_text)
+    lang = LANG_CODES.get(lang_name, "hi")
+    with span("normalize"):
+        user_text = lexicon_for(lang).normalize(user_text)
     def detect_inline_profile_update(text: str):
         upd = {}
+        hints = lexicon_for(lang).scan(text).values("hint")  # one scan, shared with the parsers below
 
         # age update
-        if ("उम्र" in text) or ("साल" in text):
-            a = parse_age(text)
+        if "age" in hints:
+            a = parse_age(text, lang)
             if a is not None:
                 upd["age"] = a
 
         # income update
-        if ("आय" in text) or ("कमाई" in text) or ("लाख" in text) or ("₹" in text) or ("रुप" in text):
-            inc = parse_income(text)
+        if "annual_income" in hints:
+            inc = parse_income(text, lang)
             if inc is not None:
                 upd["annual_income"] = inc
 
         # category update
-        if ("श्रेणी" in text) or ("कैटेगरी" in text) or ("ओबीसी" in text) or ("एससी" in text) or ("एसटी" in text) or ("ईडब्ल्यूएस" in text) or ("जनरल" in text) or ("सामान्य" in text):
-            c = parse_category(text)
+        if "category" in hints:
+            c = parse_category(text, lang)
             if c:
                 upd["category"] = c
 
         # gender update
-        if ("लिंग" in text) or ("महिला" in text) or ("पुरुष" in text):
-            g = parse_gender(text)
+        if "gender" in hints:
+            g = parse_gender(text, lang)
             if g:
                 upd["gender"] = g
 
         # student update
-        if ("छात्र" in text) or ("स्टूडेंट" in text):
-            yn = parse_yes_no(text)
+        if "is_student" in hints:
+            yn = parse_yes_no(text, lang)
             if yn is not None:
                 upd["is_student"] = yn
 
         # state update (only if strong hint words exist)
-        if ("राज्य" in text) or ("में रहता" in text) or ("से हूँ" in text) or ("से हूं" in text):
-            st = parse_state(text)
+        if "state" in hints:
+            st = parse_state(text, lang)
             if st:
                 upd["state"] = st
 
@@ -393,25 +702,30 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
     if memory["goal"] is None and memory["stage"] in ["INTAKE", "PROFILE_COLLECTION"]:
         memory["goal"] = user_text
         trace.append("goal=set")
+        q = prefetch_recommendations(user_text, profile)
+        if q is not None:
+            memory["prefetch_query"] = q
+            trace.append("prefetch=started")
 
     # 1) pending confirm has highest priority
     if memory["pending_confirm"]:
         pc = memory["pending_confirm"]
         t = user_text.lower()
+        yn = parse_yes_no(user_text, lang) if lang != "hi" else None
 
-        if "हाँ" in t or "हा" in t or "जी" in t or "yes" in t:
+        if "हाँ" in t or "हा" in t or "जी" in t or "yes" in t or yn is True:
             profile[pc["field"]] = pc["new"]
             memory["pending_confirm"] = None
             trace.append(f"pending_confirm=yes field={pc['field']}")
-            return ret("ठीक है, मैंने अपडेट कर दिया।")
+            return ret(MSG_UPDATED)
 
-        if "नहीं" in t or "मत" in t or "no" in t:
+        if "नहीं" in t or "मत" in t or "no" in t or yn is False:
             memory["pending_confirm"] = None
             trace.append(f"pending_confirm=no field={pc['field']}")
-            return ret("ठीक है, मैं पहले वाला मान ही रखूँगा।")
+            return ret(MSG_KEPT_OLD)
 
         trace.append("pending_confirm=unclear")
-        return ret("कृपया सिर्फ 'हाँ' या 'नहीं' में बताइए।")
+        return ret(MSG_YES_NO_ONLY)
     
 # ✅ Interrupt: allow profile updates in ANY stage (RECOMMEND / CONFIRM_SUBMIT too)
     inline_updates = detect_inline_profile_update(user_text)
@@ -448,24 +762,24 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
     # --- Handle submit confirmation stage ---
     if memory.get("stage") == "CONFIRM_SUBMIT":
         memory["expected_field"] = None  # prevent profile prompts here
-        yn = parse_yes_no(user_text)
+        yn = parse_yes_no(user_text, lang)
         trace.append("confirm_submit=seen")
 
         if yn is None:
             trace.append("confirm_submit=ask_yes_no")
-            return ret("क्या आप आवेदन सबमिट करना चाहते हैं? (हाँ/नहीं)")
+            return ret(MSG_CONFIRM_SUBMIT)
 
         if yn is False:
             set_stage("RECOMMEND")
             trace.append("confirm_submit=no")
-            return ret("ठीक है। आप किस योजना की जानकारी चाहते हैं? (1/2/3)")
+            return ret(MSG_WHICH_SCHEME)
 
         # yn True -> submit
         selected = memory.get("selected_scheme")
         if not selected:
             set_stage("RECOMMEND")
             trace.append("confirm_submit=yes_but_no_selected_scheme")
-            return ret("मुझे आपकी चुनी हुई योजना नहीं मिल रही। कृपया 1/2/3 चुनिए।")
+            return ret(MSG_NO_SELECTED)
 
         trace.append("tool=submit_application")
         tracking_id = save_application(profile, selected)
@@ -486,7 +800,7 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
             set_stage("READY")
             trace.append("recommend=no_cached_results_fallback_ready")
         else:
-            choice = parse_choice(user_text, max_n=min(3, len(ranked)))
+            choice = parse_choice(user_text, max_n=min(3, len(ranked)), lang=lang)
 
             # Canonical forced-choice fallback for selection
             if choice is None:
@@ -496,7 +810,7 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
 
             if choice is None:
                 trace.append("select=invalid")
-                return ret("कृपया 1/2/3 में से चुनिए।")
+                return ret(MSG_PICK_CHOICE)
 
 
 
@@ -524,24 +838,26 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
     extracted = {}
     ef = memory.get("expected_field")
 
-    if ef == "state":
-        v = parse_state(user_text)
-        if v: extracted["state"] = v
-    elif ef == "age":
-        v = parse_age(user_text)
-        if v is not None: extracted["age"] = v
-    elif ef == "annual_income":
-        v = parse_income(user_text)
-        if v is not None: extracted["annual_income"] = v
-    elif ef == "category":
-        v = parse_category(user_text)
-        if v: extracted["category"] = v
-    elif ef == "is_student":
-        v = parse_yes_no(user_text)
-        if v is not None: extracted["is_student"] = v
-    elif ef == "gender":
-        v = parse_gender(user_text)
-        if v: extracted["gender"] = v
+    with span("parse", slot=ef) as sp:
+        if ef == "state":
+            v = parse_state(user_text, lang)
+            if v: extracted["state"] = v
+        elif ef == "age":
+            v = parse_age(user_text, lang)
+            if v is not None: extracted["age"] = v
+        elif ef == "annual_income":
+            v = parse_income(user_text, lang)
+            if v is not None: extracted["annual_income"] = v
+        elif ef == "category":
+            v = parse_category(user_text, lang)
+            if v: extracted["category"] = v
+        elif ef == "is_student":
+            v = parse_yes_no(user_text, lang)
+            if v is not None: extracted["is_student"] = v
+        elif ef == "gender":
+            v = parse_gender(user_text, lang)
+            if v: extracted["gender"] = v
+        sp.set(outcome="ok" if extracted else "miss")
 
     # If expected field not parsed, ask again (NO LLM fallback)
     # if not extracted and ef is not None:
@@ -568,7 +884,7 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
         llm_data = llm_extract_profile(user_text, lang_name) or {}
 
         if "state" in llm_data:
-            st = parse_state(str(llm_data["state"]))
+            st = parse_state(str(llm_data["state"]), lang)
             if st: extracted["state"] = st
 
         if "age" in llm_data:
@@ -588,7 +904,7 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
                 pass
 
         if "category" in llm_data:
-            c = parse_category(str(llm_data["category"]))
+            c = parse_category(str(llm_data["category"]), lang)
             if c:
                 extracted["category"] = c
 
@@ -625,39 +941,14 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
 
     if search_schemes is None:
         trace.append("retriever=missing")
-        return ret("आपकी जानकारी मिल गई। अभी retriever tool सेट नहीं है।")
+        return ret(MSG_NO_RETRIEVER)
 
     query = rewrite_query(memory.get("goal") or user_text)
     trace.append(f"tool=retriever(query={query}, top_k=3)")
-    results = search_schemes(query, top_k=3)
-    trace.append(f"retriever.results={len(results)}")
-
-    if not results:
-        return ret("मुझे अभी कोई उपयुक्त योजना नहीं मिली। आप किस तरह की मदद चाहते हैं (शिक्षा/स्वास्थ्य/घर/नौकरी)?")
-
-    msg = "आपके लिए ये योजनाएँ उपयोगी हो सकती हैं:\n"
-    ranked = []
+    ranked = rank_schemes(query, profile, trace)
 
-    for r in results:
-        trace.append(f"tool=eligibility({r['scheme_id']})")
-        e = check_eligibility(r["scheme_id"], profile)
-
-        if e["status"] == "eligible":
-            tag = "✅ पात्र"
-        elif e["status"] == "not_eligible":
-            tag = "❌ पात्र नहीं"
-        else:
-            tag = "⚠️ जानकारी चाहिए"
-
-        ranked.append((r, e, tag))
-
-    for i, (r, e, tag) in enumerate(ranked, 1):
-        msg += f"\n{i}) {r['name_hi']} {tag}\n"
-        msg += f"   - {r['summary_hi']}\n"
-        if e.get("checks"):
-            first = e["checks"][0]
-            if first.get("explain_hi"):
-                msg += f"   - कारण: {first['explain_hi']}\n"
+    if not ranked:
+        return ret(MSG_NO_RESULTS)
 
     top_missing = ranked[0][1].get("missing_fields", []) if ranked else []
     if top_missing:
@@ -667,9 +958,11 @@ def process_turn(user_text: str, lang_name: str, memory: dict):
         memory["last_results"] = ranked
         trace.append(f"eligibility.top_missing={mfield}")
         trace.append(f"ask_field={mfield}")
-        return ret(f"इस योजना की पात्रता जांचने के लिए एक सवाल: {ask_for_field(mfield)}")
+        return ret(ELIGIBILITY_QUESTION_PREFIX + ask_for_field(mfield))
 
-    msg += "\nआप किस योजना की आवेदन प्रक्रिया जानना चाहते हैं? (1/2/3)"
+    parts = recommendation_parts(ranked)
+    parts.append(MSG_RECO_FOOTER)
     set_stage("RECOMMEND")
     memory["last_results"] = ranked
-    return ret(msg)
+    memory["reply_parts"] = parts
+    return ret("".join(parts))
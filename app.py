@@ -1,6 +1,19 @@
+import asyncio
+import os
+import tempfile
+import threading
 import gradio as gr
-from speech import transcribe_audio, tts_to_file
-from agent_core import process_turn
+from speech import (
+    transcribe_audio, tts_audio, prerender_tts, STTBusy, constrained_slot,
+    stream_start, stream_buffer, stream_decode, stream_finish, to_whisper_audio, load_models,
+)
+from tts import tts_to_file, tts_audio_concat, split_for_tts, streamable, resolve_profile, TTS_DEFAULT_PROFILE
+from agent_core import process_turn, parse_for_slot, fixed_prompts, reply_fragments, scheme_by_id
+from janitor import FileJanitor
+from session_store import open_sessions
+from telemetry import span, turn_context, serve_metrics, METRICS_PORT
+from profiling import profile_turn
+from pipeline import STT, AGENT, TTS, StageBusy, PIPELINE_MAX_TURNS
 
 LANGS = {
     "Hindi (hi)": ("hi", "Hindi"),
@@ -15,6 +28,30 @@ LANGS = {
     "Punjabi (pa)": ("pa", "Punjabi"),
 }
 
+STREAMING = os.getenv("STT_STREAMING", "0") == "1"
+
+# Reply audio in sentence chunks streamed into gr.Audio(streaming=True): playback
+# starts after the first sentence instead of after the whole (long) reply.
+TTS_STREAM = os.getenv("TTS_STREAM", "1") == "1"
+TTS_PRERENDER_FRAGMENTS = os.getenv("TTS_PRERENDER_FRAGMENTS", "1") == "1"  # scheme/eligibility reply pieces
+
+# per-session connection choice -> tts output profile (Opus/Ogg below full)
+CONNECTIONS = {
+    "Wi-Fi / 4G": "full",
+    "3G": "3g",
+    "2G": "2g",
+}
+DEFAULT_CONNECTION = next((k for k, v in CONNECTIONS.items() if v == TTS_DEFAULT_PROFILE), "Wi-Fi / 4G")
+
+# Gradio keeps every mic upload / served file in its temp dir; expire them
+GRADIO_TMP_DIR = os.getenv("GRADIO_TEMP_DIR") or os.path.join(tempfile.gettempdir(), "gradio")
+AUDIO_TTL_S = float(os.getenv("AUDIO_TTL_S", "3600"))
+
+SESSIONS = open_sessions(scheme_by_id)
+
+MSG_NOT_HEARD = "मैं आपकी आवाज़ ठीक से नहीं सुन पाया। कृपया फिर से बोलिए।"
+MSG_BUSY = "अभी बहुत सारे लोग बात कर रहे हैं। कृपया थोड़ी देर बाद फिर से बोलिए।"
+
 def pairs_to_messages(pairs):
     msgs = []
     for u, a in pairs:
@@ -22,41 +59,177 @@ def pairs_to_messages(pairs):
         msgs.append({"role": "assistant", "content": a})
     return msgs
 
-def voice_turn(audio_file, lang_key, chat_pairs, agent_mem):
-    # If mic is empty/cleared, do nothing (prevents crashes)
-    if not audio_file:
-        trace_text = (agent_mem or {}).get("last_trace", "")
-        return pairs_to_messages(chat_pairs), None, "", "", trace_text, chat_pairs, agent_mem
-
-    lang_code, lang_name = LANGS[lang_key]
+def _stt_hints(agent_mem, lang_code):
+    # STT tiering: tell Whisper what kind of answer the agent is waiting for
+    mem = agent_mem or {}
+    stage = "PENDING_CONFIRM" if mem.get("pending_confirm") else mem.get("stage")
+    slot = constrained_slot(mem.get("expected_field"), stage)
+    return {
+        "expected_field": mem.get("expected_field"),
+        "stage": stage,
+        "validate": (lambda t: parse_for_slot(t, slot, lang_code) is not None) if slot else None,
+    }
+
+# ----------------------------
+# Sessions: the browser only holds a session id; memory lives in the store
+# ----------------------------
+def _session(session_id):
+    session_id = session_id or SESSIONS.new_id()
+    agent_mem, chat_pairs, rec = SESSIONS.load(session_id)
+    return session_id, agent_mem, chat_pairs, rec
+
+def _outputs(session_id, agent_mem, chat_pairs, audio_out, user_text, bot_text):
+    trace_text = (agent_mem or {}).get("last_trace", "")
+    return pairs_to_messages(chat_pairs), audio_out, user_text, bot_text, trace_text, session_id
 
-    # 1) STT
-    user_text = transcribe_audio(audio_file, lang_code)
+def _agent_step(user_text, lang_name, session_id, agent_mem, chat_pairs, rec):
+    bot_text, agent_mem = process_turn(user_text, lang_name, agent_mem)
+    chat_pairs = chat_pairs + [(user_text, bot_text)]
+    SESSIONS.save(session_id, agent_mem, chat_pairs, rec)
+    return bot_text, agent_mem, chat_pairs
+
+def _start_speech(text, lang_code, connection, parts=None):
+    """
+    Schedule TTS for a reply on the TTS stage; returns futures in play order.
+    Streaming: one per sentence chunk, all rendering in parallel, so the first
+    one is playable while the rest is still being synthesized.
+    parts: the reply's precompiled fragments (recommendations); each is its own
+    cached clip, so those replies are mostly assembled from pre-rendered audio.
+    """
+    profile = resolve_profile(CONNECTIONS.get(connection))
+    chunks = [p.strip() for p in parts if p.strip()] if parts and "".join(parts) == text else None
+    if TTS_STREAM and streamable(profile):
+        return [asyncio.ensure_future(TTS.run(tts_to_file, c, lang_code, profile)) for c in chunks or split_for_tts(text)]
+    if profile == "full":
+        if chunks:
+            return [asyncio.ensure_future(TTS.run(tts_audio_concat, chunks, lang_code))]
+        return [asyncio.ensure_future(TTS.run(tts_audio, text, lang_code))]
+    return [asyncio.ensure_future(TTS.run(tts_to_file, text, lang_code, profile))]
+
+async def _audio(fut):
+    # a full TTS stage shouldn't lose the turn; the text reply still goes out
+    try:
+        return await fut
+    except StageBusy:
+        return None
+
+async def _reply(user_text, lang_code, lang_name, connection, session_id, agent_mem, chat_pairs, rec):
+    """Agent step, then TTS scheduled. Returns ((session_id, mem, pairs, user_text, bot_text), audio futures)."""
+    # If STT returned nothing, ask again
     if not user_text:
-        bot_text = "मैं आपकी आवाज़ ठीक से नहीं सुन पाया। कृपया फिर से बोलिए।"
-        audio_out = tts_to_file(bot_text, "hi")
-        trace_text = (agent_mem or {}).get("last_trace", "")
-        return pairs_to_messages(chat_pairs), audio_out, user_text, bot_text, trace_text, chat_pairs, agent_mem
+        return (session_id, agent_mem, chat_pairs, user_text, MSG_NOT_HEARD), _start_speech(MSG_NOT_HEARD, "hi", connection)
 
     # 2) AGENT
-    bot_text, agent_mem = process_turn(user_text, lang_name, agent_mem)
-    trace_text = (agent_mem or {}).get("last_trace", "")
+    try:
+        bot_text, agent_mem, chat_pairs = await AGENT.run(
+            _agent_step, user_text, lang_name, session_id, agent_mem, chat_pairs, rec
+        )
+    except StageBusy:
+        return _busy_reply(session_id, agent_mem, chat_pairs, connection)
 
     # 3) TTS
-    audio_out = tts_to_file(bot_text, lang_code)
+    futures = _start_speech(bot_text, lang_code, connection, agent_mem.get("reply_parts"))
+    return (session_id, agent_mem, chat_pairs, user_text, bot_text), futures
+
+def _busy_reply(session_id, agent_mem, chat_pairs, connection):
+    return (session_id, agent_mem, chat_pairs, "", MSG_BUSY), _start_speech(MSG_BUSY, "hi", connection)
+
+def _drop(futures):
+    for f in futures:
+        if f.done():
+            f.cancelled() or f.exception()  # retrieved, so asyncio doesn't log it
+        else:
+            f.cancel()
+
+async def _play(reply, first_audio, rest, extra=()):
+    """UI outputs: once with the first audio chunk, then once per further chunk."""
+    session_id, agent_mem, chat_pairs, user_text, bot_text = reply
+    yield _outputs(session_id, agent_mem, chat_pairs, first_audio, user_text, bot_text) + extra
+    for i, fut in enumerate(rest):
+        audio = await _audio(fut)
+        if audio is None:
+            _drop(rest[i + 1:])
+            return
+        yield _outputs(session_id, agent_mem, chat_pairs, audio, user_text, bot_text) + extra
+
+async def voice_turn(audio_in, lang_key, session_id, connection=DEFAULT_CONNECTION):
+    session_id, agent_mem, chat_pairs, rec = _session(session_id)
 
-    chat_pairs = chat_pairs + [(user_text, bot_text)]
-    return pairs_to_messages(chat_pairs), audio_out, user_text, bot_text, trace_text, chat_pairs, agent_mem
+    # If mic is empty/cleared, do nothing (prevents crashes)
+    if audio_in is None:
+        yield _outputs(session_id, agent_mem, chat_pairs, None, "", "")
+        return
+
+    lang_code, lang_name = LANGS[lang_key]
+
+    # the turn span ends at the first playable audio (what the caller waits for)
+    turn_no = len(chat_pairs) + 1
+    with turn_context(session=session_id, turn=turn_no, lang=lang_code), \
+            profile_turn(session_id, turn_no, this_thread=False) as prof, span("turn"):
+        # 1) STT: (sr, samples) straight from the browser, resampled once, never written to disk
+        sr, samples = audio_in
+        try:
+            user_text = await STT.run(
+                lambda: transcribe_audio(to_whisper_audio(sr, samples), lang_code, **_stt_hints(agent_mem, lang_code))
+            )
+        except (STTBusy, StageBusy):
+            reply, speech = _busy_reply(session_id, agent_mem, chat_pairs, connection)
+        else:
+            reply, speech = await _reply(user_text, lang_code, lang_name, connection, session_id, agent_mem, chat_pairs, rec)
+        first = await _audio(speech[0])
+        if prof:
+            prof.set(trace=reply[1].get("last_trace", ""), reply=reply[4])
+
+    async for out in _play(reply, first, speech[1:]):
+        yield out
+
+# ----------------------------
+# Streaming mic (STT_STREAMING=1)
+# ----------------------------
+async def stream_chunk(chunk, stream_state, lang_key):
+    # transcribe finished segments while the user is still speaking
+    lang_code, _ = LANGS[lang_key]
+    # buffered outside the stage: a chunk must not be lost when STT is busy
+    stream_state = stream_buffer(stream_state, chunk)
+    try:
+        stream_state = await STT.run(stream_decode, stream_state, lang_code)
+    except (STTBusy, StageBusy):
+        pass  # decoded with a later segment or at stream_finish
+    return stream_state, " ".join(stream_state["texts"])
+
+async def stream_turn(stream_state, lang_key, session_id, connection=DEFAULT_CONNECTION):
+    # end of speech: only the trailing segment is still undecoded
+    session_id, agent_mem, chat_pairs, rec = _session(session_id)
+    lang_code, lang_name = LANGS[lang_key]
+    turn_no = len(chat_pairs) + 1
+    with turn_context(session=session_id, turn=turn_no, lang=lang_code), \
+            profile_turn(session_id, turn_no, this_thread=False) as prof, span("turn"):
+        try:
+            user_text = await STT.run(stream_finish, stream_state, lang_code, **_stt_hints(agent_mem, lang_code))
+        except (STTBusy, StageBusy):
+            reply, speech = _busy_reply(session_id, agent_mem, chat_pairs, connection)
+        else:
+            reply, speech = await _reply(user_text, lang_code, lang_name, connection, session_id, agent_mem, chat_pairs, rec)
+        first = await _audio(speech[0])
+        if prof:
+            prof.set(trace=reply[1].get("last_trace", ""), reply=reply[4])
+
+    async for out in _play(reply, first, speech[1:], (stream_start(),)):
+        yield out
 
 
 with gr.Blocks(title="Voice Welfare Agent - Step 2") as demo:
     gr.Markdown("## Step 2: Agent + Memory (Voice → STT → Agent → TTS)\nRecord, then click **Send / Process**.")
 
     lang_key = gr.Dropdown(choices=list(LANGS.keys()), value="Hindi (hi)", label="Language")
+    connection = gr.Dropdown(choices=list(CONNECTIONS), value=DEFAULT_CONNECTION, label="Connection")
     chat = gr.Chatbot(label="Conversation")
 
-    audio_in = gr.Audio(sources=["microphone"], type="filepath", label="Speak (mic)")
-    audio_out = gr.Audio(label="Assistant Voice Output", autoplay=True)
+    if STREAMING:
+        audio_in = gr.Audio(sources=["microphone"], type="numpy", streaming=True, label="Speak (mic)")
+    else:
+        audio_in = gr.Audio(sources=["microphone"], type="numpy", label="Speak (mic)")
+    audio_out = gr.Audio(label="Assistant Voice Output", autoplay=True, streaming=TTS_STREAM)
 
     dbg_user = gr.Textbox(label="STT Text (debug)", interactive=False)
     dbg_bot = gr.Textbox(label="Assistant Text (debug)", interactive=False)
@@ -64,19 +237,61 @@ with gr.Blocks(title="Voice Welfare Agent - Step 2") as demo:
     # ✅ Create this BEFORE using it in outputs
     dbg_trace = gr.Textbox(label="Tool/State Trace (debug)", interactive=False)
 
-    state = gr.State([])  # list of (user, bot)
-    agent_state = gr.State({"stage": "INTAKE", "profile": {}, "pending_confirm": None})
-
-    send_btn = gr.Button("Send / Process")
-
-    # ✅ ONLY ONE trigger (button)
-    send_btn.click(
-        fn=voice_turn,
-        inputs=[audio_in, lang_key, state, agent_state],
-        outputs=[chat, audio_out, dbg_user, dbg_bot, dbg_trace, state, agent_state]
-    ).then(lambda: None, outputs=audio_in)  # clear mic so record button reappears
+    session_state = gr.State(None)  # session id; memory + chat pairs live in SESSIONS
+
+    if STREAMING:
+        # chunks are transcribed as they arrive; stopping the mic ends the turn
+        stream_state = gr.State(stream_start())
+        audio_in.stream(
+            fn=stream_chunk,
+            inputs=[audio_in, stream_state, lang_key],
+            outputs=[stream_state, dbg_user],
+            concurrency_limit=PIPELINE_MAX_TURNS,
+        )
+        audio_in.stop_recording(
+            fn=stream_turn,
+            inputs=[stream_state, lang_key, session_state, connection],
+            outputs=[chat, audio_out, dbg_user, dbg_bot, dbg_trace, session_state, stream_state],
+            concurrency_limit=PIPELINE_MAX_TURNS,
+        )
+    else:
+        send_btn = gr.Button("Send / Process")
+
+        # ✅ ONLY ONE trigger (button)
+        send_btn.click(
+            fn=voice_turn,
+            inputs=[audio_in, lang_key, session_state, connection],
+            outputs=[chat, audio_out, dbg_user, dbg_bot, dbg_trace, session_state],
+            concurrency_limit=PIPELINE_MAX_TURNS,  # turns overlap; each stage is bounded by its own pool
+        ).then(lambda: None, outputs=audio_in)  # clear mic so record button reappears
+
+def _prerender():
+    codes = [code for code, _ in LANGS.values()]
+    prerender_tts(fixed_prompts() + [MSG_NOT_HEARD, MSG_BUSY], codes, chunked=TTS_STREAM)
+    if TTS_PRERENDER_FRAGMENTS:
+        try:
+            prerender_tts(reply_fragments(), codes)  # already one clip per fragment
+        except Exception as e:
+            print(f"prerender: reply fragments skipped ({type(e).__name__}: {e})")
+
+def main(server_port=None, metrics_port=METRICS_PORT):
+    """Start the UI. Startup side effects live here so benches/prefork can import voice_turn."""
+    # Pre-render fixed prompts for every UI language in the background (gTTS is a network call)
+    threading.Thread(target=_prerender, daemon=True).start()
+
+    FileJanitor([GRADIO_TMP_DIR], ttl=AUDIO_TTL_S).start()
+
+    load_models()  # Whisper loads here, not on the first caller's turn
+
+    serve_metrics(metrics_port)  # Prometheus scrape target when METRICS_PORT is set
+
+    demo.queue(default_concurrency_limit=PIPELINE_MAX_TURNS)
+    demo.launch(server_port=server_port)
+
+
+if __name__ == "__main__":
+    main()
 
-demo.launch()
 
 
 
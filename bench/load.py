@@ -0,0 +1,280 @@
+"""
+Load generator: N simulated callers talking to app.voice_turn concurrently,
+the same coroutine Gradio runs per click, so STT/agent/TTS go through the real
+pipeline stages, Whisper pool and session store. Backends are the offline
+stand-ins from bench/standins.py, so this runs in CI.
+
+    python -m bench.load --sessions 200 --arrival-rate 5 --think-time 3
+    python -m bench.load --sessions 50 --arrival-rate 0      # all callers at once
+    python -m bench.load --clips clips.json                  # {"<turn text>": "clip.wav"}
+
+Every --interval seconds: turns/s, turn latency, queue wait per stage, thread
+CPU per stage, process CPU and RSS. A summary follows at the end.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import telemetry
+from bench.report import percentiles
+from bench.standins import install, synth_speech, register_clip, SAMPLE_RATE
+
+BENCH_DIR = Path(__file__).resolve().parent
+CONVERSATIONS_PATH = BENCH_DIR / "conversations.json"
+
+# spans that are the work of each pipeline stage (queue_wait spans carry stage= themselves)
+STAGE_SPANS = {
+    "stt": ("stt",),
+    "agent": ("agent", "session.save"),
+    "tts": ("tts", "tts.decode"),
+}
+_SPAN_STAGE = {name: stage for stage, names in STAGE_SPANS.items() for name in names}
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource  # not Linux: peak instead of current (kB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class Window:
+    """Telemetry listener: spans finished since the last drain()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = []
+
+    def __call__(self, sp):
+        with self._lock:
+            self._spans.append((sp.name, sp.attrs.get("stage"), sp.duration, sp.cpu))
+
+    def drain(self) -> list:
+        with self._lock:
+            out, self._spans = self._spans, []
+        return out
+
+
+class Totals:
+    def __init__(self):
+        self.turn = []
+        self.queue_wait = defaultdict(list)
+        self.stage = defaultdict(list)
+        self.cpu = defaultdict(float)
+        self.counts = defaultdict(int)  # sessions_done, abandoned, busy, not_heard, turns
+
+    def add(self, spans):
+        """Fold spans into the totals; returns this window's (turn, queue_wait, stage cpu)."""
+        turn, qwait, cpu = [], defaultdict(list), defaultdict(float)
+        for name, stage, dur, c in spans:
+            if name == "turn":
+                turn.append(dur)
+            elif name == "queue_wait":
+                qwait[stage].append(dur)
+            elif name in _SPAN_STAGE:
+                st = _SPAN_STAGE[name]
+                cpu[st] += c
+                if name == STAGE_SPANS[st][0]:
+                    self.stage[st].append(dur)
+        self.turn += turn
+        for k, v in qwait.items():
+            self.queue_wait[k] += v
+        for k, v in cpu.items():
+            self.cpu[k] += v
+        return turn, qwait, cpu
+
+
+def load_clips(manifest: Path) -> dict:
+    """{"<turn text>": "path.wav"} (paths relative to the manifest) -> {text: 16 kHz clip}."""
+    import tts_backends
+    from speech import to_whisper_audio
+
+    clips = {}
+    for text, path in json.loads(manifest.read_text(encoding="utf-8")).items():
+        sr, data = tts_backends.decode(str(manifest.parent / path))
+        clip = to_whisper_audio(sr, data)
+        register_clip(clip, text)
+        clips[text] = clip
+    return clips
+
+
+async def caller(app, conv: dict, clips: dict, think, totals: Totals, retries: int, profile: str = "full"):
+    """One simulated session: speak each scripted turn, wait, repeat; a busy reply is retried."""
+    lang_key = next(k for k, (code, _) in app.LANGS.items() if code == conv.get("lang", "hi"))
+    connection = next(k for k, p in app.CONNECTIONS.items() if p == profile)
+    session_id = None
+    for text in conv["turns"]:
+        for _ in range(retries + 1):
+            async for out in app.voice_turn((SAMPLE_RATE, clips[text]), lang_key, session_id, connection):
+                pass  # one update per streamed audio chunk; the turn is over after the last
+            session_id = out[5]
+            if out[3] != app.MSG_BUSY:
+                break
+            totals.counts["busy"] += 1
+            await asyncio.sleep(think())
+        else:
+            totals.counts["abandoned"] += 1
+            return
+        totals.counts["turns"] += 1
+        if out[3] == app.MSG_NOT_HEARD:
+            totals.counts["not_heard"] += 1
+        await asyncio.sleep(think())
+    totals.counts["sessions_done"] += 1
+
+
+def _fmt(ms):
+    return f"{ms:7.1f}" if ms is not None else "      -"
+
+
+async def ticker(window: Window, totals: Totals, interval: float, t0: float, timeline: list, done: asyncio.Event):
+    from pipeline import pipeline_stats
+
+    last_t, last_cpu = time.perf_counter(), time.process_time()
+    print(f"{'t s':>6} {'turns/s':>8} {'turn p50':>8} {'p95':>7} {'qwait95 stt':>11} {'agent':>7} {'tts':>7} "
+          f"{'cpu% stt':>8} {'agent':>6} {'tts':>6} {'proc':>6} {'rss MB':>7} {'pending':>8}")
+    while True:
+        try:
+            await asyncio.wait_for(done.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        now, cpu_now = time.perf_counter(), time.process_time()
+        dt = max(now - last_t, 1e-9)
+        turn, qwait, cpu = totals.add(window.drain())
+        t = percentiles(turn, (50, 95))
+        q = {st: percentiles(qwait.get(st, []), (95,))["p95"] for st in STAGE_SPANS}
+        pending = {name: s["pending"] for name, s in pipeline_stats().items()}
+        row = {
+            "t": round(now - t0, 2),
+            "turns_per_s": round(len(turn) / dt, 3),
+            "turn_ms": t,
+            "queue_wait_p95_ms": q,
+            "cpu_pct": {st: round(100 * cpu.get(st, 0.0) / dt, 1) for st in STAGE_SPANS},
+            "process_cpu_pct": round(100 * (cpu_now - last_cpu) / dt, 1),
+            "rss_mb": round(rss_bytes() / 2**20, 1),
+            "pending": pending,
+        }
+        timeline.append(row)
+        print(f"{row['t']:>6.1f} {row['turns_per_s']:>8.2f} {_fmt(t['p50']):>8} {_fmt(t['p95'])} "
+              f"{_fmt(q['stt']):>11} {_fmt(q['agent'])} {_fmt(q['tts'])} "
+              f"{row['cpu_pct']['stt']:>8.1f} {row['cpu_pct']['agent']:>6.1f} {row['cpu_pct']['tts']:>6.1f} "
+              f"{row['process_cpu_pct']:>6.1f} {row['rss_mb']:>7.1f} {sum(pending.values()):>8}")
+        last_t, last_cpu = now, cpu_now
+        if done.is_set():
+            return
+
+
+async def drive(args) -> dict:
+    import app  # after install(): picks up the stand-in backends and memory session store
+
+    conversations = json.loads(args.conversations.read_text(encoding="utf-8"))
+    clips = load_clips(args.clips) if args.clips else {}
+    for conv in conversations:
+        for text in conv["turns"]:
+            if text not in clips:
+                clips[text] = synth_speech(text)
+
+    rng = random.Random(args.seed)
+
+    def think():
+        if args.think_time <= 0:
+            return 0.0
+        return rng.expovariate(1 / args.think_time) if args.think_dist == "exp" else args.think_time
+
+    window, totals = Window(), Totals()
+    telemetry.add_listener(window)
+
+    # one caller first so model/index loads don't show up as queueing
+    await caller(app, conversations[0], clips, lambda: 0.0, Totals(), args.retries, args.profile)
+    window.drain()
+
+    done = asyncio.Event()
+    timeline = []
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    tick = asyncio.create_task(ticker(window, totals, args.interval, t0, timeline, done))
+
+    tasks = []
+    for i in range(args.sessions):
+        conv = conversations[i % len(conversations)]
+        tasks.append(asyncio.create_task(caller(app, conv, clips, think, totals, args.retries, args.profile)))
+        if args.arrival_rate > 0:
+            await asyncio.sleep(rng.expovariate(args.arrival_rate))
+    await asyncio.gather(*tasks)
+
+    done.set()
+    await tick
+    telemetry.remove_listener(window)
+    wall = time.perf_counter() - t0
+
+    from pipeline import pipeline_stats
+    from speech import stt_stats
+
+    return {
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "wall_s": round(wall, 2),
+        "counts": dict(totals.counts),
+        "throughput_turns_per_s": round(totals.counts["turns"] / wall, 3),
+        "turn_ms": percentiles(totals.turn),
+        "stage_ms": {st: percentiles(totals.stage[st]) for st in STAGE_SPANS},
+        "queue_wait_ms": {st: percentiles(totals.queue_wait[st]) for st in STAGE_SPANS},
+        "cpu_s": {st: round(totals.cpu[st], 3) for st in STAGE_SPANS},
+        "process_cpu_s": round(time.process_time() - cpu0, 3),
+        "peak_rss_mb": max((r["rss_mb"] for r in timeline), default=None),
+        "pipeline": pipeline_stats(),
+        "stt": stt_stats(),
+        "timeline": timeline,
+    }
+
+
+def print_summary(res: dict):
+    c = res["counts"]
+    print()
+    print(f"{res['wall_s']} s, {c.get('turns', 0)} turns ({res['throughput_turns_per_s']} turns/s), "
+          f"{c.get('sessions_done', 0)} sessions done, {c.get('abandoned', 0)} abandoned, "
+          f"{c.get('busy', 0)} busy replies, {c.get('not_heard', 0)} not heard")
+    t = res["turn_ms"]
+    print(f"turn ms: p50 {_fmt(t['p50'])} p95 {_fmt(t['p95'])} p99 {_fmt(t['p99'])}")
+    print(f"{'stage':8} {'p50 ms':>8} {'p95':>8} {'p99':>8} {'qwait p50':>10} {'p95':>8} {'p99':>8} {'cpu s':>8}")
+    for st in STAGE_SPANS:
+        s, q = res["stage_ms"][st], res["queue_wait_ms"][st]
+        print(f"{st:8} {_fmt(s['p50']):>8} {_fmt(s['p95']):>8} {_fmt(s['p99']):>8} "
+              f"{_fmt(q['p50']):>10} {_fmt(q['p95']):>8} {_fmt(q['p99']):>8} {res['cpu_s'][st]:>8.2f}")
+    print(f"process cpu {res['process_cpu_s']} s, peak rss {res['peak_rss_mb']} MB")
+    for st in res["pipeline"].values():
+        print(f"stage {st['stage']}: submitted {st['submitted']}, rejected {st['rejected']}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Concurrent voice sessions against stand-in backends")
+    ap.add_argument("--sessions", type=int, default=50)
+    ap.add_argument("--arrival-rate", type=float, default=2.0, help="new sessions per second (Poisson); 0 = all at once")
+    ap.add_argument("--think-time", type=float, default=2.0, help="seconds between a reply and the next turn (mean)")
+    ap.add_argument("--think-dist", choices=["exp", "fixed"], default="exp")
+    ap.add_argument("--retries", type=int, default=3, help="re-speak a turn this often after a busy reply")
+    ap.add_argument("--profile", choices=["full", "3g", "2g"], default="full", help="callers' audio output profile")
+    ap.add_argument("--conversations", type=Path, default=CONVERSATIONS_PATH)
+    ap.add_argument("--clips", type=Path, help='JSON {"<turn text>": "clip.wav"}; other turns are synthesized')
+    ap.add_argument("--interval", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", type=Path, help="write summary + timeline here")
+    args = ap.parse_args()
+
+    install(Path(tempfile.mkdtemp(prefix="bench-load-")))
+    res = asyncio.run(drive(args))
+    print_summary(res)
+    if args.json:
+        args.json.write_text(json.dumps(res, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
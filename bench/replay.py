@@ -0,0 +1,198 @@
+"""
+Replay scripted conversations (bench/conversations.json) through process_turn,
+as text and as synthetic audio, against the fake LLM and the STT/TTS stand-ins
+in bench/standins.py. Nothing leaves the machine; applications and the TTS cache
+go to a temp dir.
+
+    python -m bench.replay                        # compare with bench/baseline.json
+    python -m bench.replay --save-baseline        # record this run as the baseline
+    python -m bench.replay --modes text --repeat 20 --json out.json
+
+Exit status 1 if a conversation no longer reaches submission or a metric
+regressed past the thresholds.
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from bench.report import SpanRecorder
+from bench.standins import install, synth_speech, STT_RTF, STT_FAST_RTF, TTS_MS_PER_CHAR
+
+BENCH_DIR = Path(__file__).resolve().parent
+CONVERSATIONS_PATH = BENCH_DIR / "conversations.json"
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+
+
+def stt_hints(memory, lang_code):
+    # same hints app._stt_hints gives Whisper (app.py itself needs Gradio)
+    from agent_core import parse_for_slot
+    from speech import constrained_slot
+
+    stage = "PENDING_CONFIRM" if memory.get("pending_confirm") else memory.get("stage")
+    slot = constrained_slot(memory.get("expected_field"), stage)
+    return {
+        "expected_field": memory.get("expected_field"),
+        "stage": stage,
+        "validate": (lambda t: parse_for_slot(t, slot, lang_code) is not None) if slot else None,
+    }
+
+
+def run_conversation(sessions, conv: dict, mode: str) -> dict:
+    """One scripted conversation in a fresh session, one turn at a time like the UI."""
+    from agent_core import process_turn, LANG_CODES
+    from speech import transcribe_audio, tts_audio
+    from telemetry import span, turn_context
+    from profiling import profile_turn
+
+    lang = conv.get("lang", "hi")
+    lang_name = {code: name for name, code in LANG_CODES.items()}[lang]
+    sid = sessions.new_id()
+    submitted_at = None
+
+    for i, text in enumerate(conv["turns"], start=1):
+        clip = synth_speech(text) if mode == "audio" else None
+        memory, history, rec = sessions.load(sid)
+        with turn_context(session=sid, turn=i, lang=lang, channel="bench", mode=mode), \
+                profile_turn(sid, i), span("turn"):  # PROFILE_TURNS=1: a flamegraph per replayed turn
+            heard = transcribe_audio(clip, lang, **stt_hints(memory, lang)) if clip is not None else text
+            reply, memory = process_turn(heard, lang_name, memory)
+            sessions.save(sid, memory, history + [(heard, reply)], rec)
+            if mode == "audio":
+                tts_audio(reply, lang)
+        if submitted_at is None and "tool=submit_application" in memory.get("last_trace", ""):
+            submitted_at = i
+
+    return {"name": conv["name"], "mode": mode, "session": sid, "submitted_at": submitted_at}
+
+
+def run(conversations, modes, repeat: int, warmup: int) -> dict:
+    from agent_core import scheme_by_id
+    from session_store import open_sessions
+
+    sessions = open_sessions(scheme_by_id)
+    with SpanRecorder("mode") as rec:
+        for _ in range(warmup):  # model/index loads and first-call costs stay out of the numbers
+            for conv in conversations:
+                run_conversation(sessions, conv, modes[0])
+        rec.clear()
+
+        results = [
+            run_conversation(sessions, conv, mode)
+            for mode in modes
+            for _ in range(repeat)
+            for conv in conversations
+        ]
+
+    llm = {}
+    turns = {}
+    failed = []
+    for r in results:
+        llm.setdefault(r["mode"], []).append(rec.llm_calls.get(r["session"], 0))
+        turns[f"{r['mode']}/{r['name']}"] = r["submitted_at"]
+    for conv in conversations:
+        for mode in modes:
+            if conv.get("submits") and turns[f"{mode}/{conv['name']}"] is None:
+                failed.append(f"{mode}/{conv['name']}")
+
+    return {
+        "config": {
+            "repeat": repeat,
+            "conversations": len(conversations),
+            "stt_rtf": STT_RTF,
+            "stt_fast_rtf": STT_FAST_RTF,
+            "tts_ms_per_char": TTS_MS_PER_CHAR,
+        },
+        "latency_ms": rec.latency(),
+        "llm_calls_per_conversation": {m: round(sum(v) / len(v), 3) for m, v in llm.items()},
+        "turns_to_submission": turns,
+        "failed": failed,
+    }
+
+
+# ----------------------------
+# Baseline comparison
+# ----------------------------
+def compare(current: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """Regressions as readable lines; latency only counts past both the relative and absolute margin."""
+    out = []
+    for key, base in baseline.get("latency_ms", {}).items():
+        cur = current["latency_ms"].get(key)
+        if not cur:
+            continue
+        for p in ("p50", "p95", "p99"):
+            b, c = base.get(p), cur.get(p)
+            if b is None or c is None:
+                continue
+            if c > b * (1 + threshold) and c - b > min_delta_ms:
+                out.append(f"latency {key} {p}: {b:.2f} -> {c:.2f} ms")
+
+    for mode, b in baseline.get("llm_calls_per_conversation", {}).items():
+        c = current["llm_calls_per_conversation"].get(mode)
+        if c is not None and c > b:
+            out.append(f"llm calls/conversation {mode}: {b} -> {c}")
+
+    for key, b in baseline.get("turns_to_submission", {}).items():
+        if key not in current["turns_to_submission"]:
+            continue
+        c = current["turns_to_submission"][key]
+        if b is not None and (c is None or c > b):
+            out.append(f"turns to submission {key}: {b} -> {c}")
+    return out
+
+
+def print_report(res: dict):
+    print(f"{'stage':32} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for key, p in res["latency_ms"].items():
+        print(f"{key:32} {p['n']:>6} {p['p50']:>9.2f} {p['p95']:>9.2f} {p['p99']:>9.2f}")
+    print()
+    for mode, n in res["llm_calls_per_conversation"].items():
+        print(f"llm calls/conversation ({mode}): {n}")
+    for key, n in res["turns_to_submission"].items():
+        print(f"turns to submission {key}: {n if n is not None else '-'}")
+    for key in res["failed"]:
+        print(f"FAILED (no submission): {key}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay scripted conversations against stand-in backends")
+    ap.add_argument("--conversations", type=Path, default=CONVERSATIONS_PATH)
+    ap.add_argument("--modes", nargs="+", choices=["text", "audio"], default=["text", "audio"])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed relative latency increase")
+    ap.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore latency changes smaller than this")
+    ap.add_argument("--json", type=Path, help="also write the full result here")
+    args = ap.parse_args()
+
+    install(Path(tempfile.mkdtemp(prefix="bench-replay-")))
+    conversations = json.loads(args.conversations.read_text(encoding="utf-8"))
+    res = run(conversations, args.modes, args.repeat, args.warmup)
+    print_report(res)
+
+    if args.json:
+        args.json.write_text(json.dumps(res, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(res, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nbaseline written to {args.baseline}")
+        return 1 if res["failed"] else 0
+
+    regressions = []
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("config") != res["config"]:
+            print(f"\nnote: stand-in config differs from the baseline's {baseline.get('config')}")
+        regressions = compare(res, baseline, args.threshold, args.min_delta_ms)
+        print(f"\nvs {args.baseline}: {len(regressions)} regression(s)")
+        for line in regressions:
+            print("  " + line)
+    else:
+        print(f"\nno baseline at {args.baseline}; run with --save-baseline to record one")
+    return 1 if res["failed"] or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
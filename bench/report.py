@@ -0,0 +1,55 @@
+import threading
+from collections import defaultdict
+
+import telemetry
+
+
+def percentiles(values, ps=(50, 95, 99)) -> dict:
+    """Nearest-rank percentiles in ms (values in seconds)."""
+    vals = sorted(values)
+    out = {"n": len(vals)}
+    for p in ps:
+        out[f"p{p}"] = round(vals[min(len(vals) - 1, int(p / 100 * len(vals)))] * 1000, 3) if vals else None
+    return out
+
+
+class SpanRecorder:
+    """
+    Telemetry listener keeping every span's duration, grouped by (group, span name),
+    where group is a turn attribute (e.g. mode) or "background" for spans opened
+    outside a turn (prefetch threads). Also counts LLM calls per session.
+    """
+
+    def __init__(self, group_by: str = "mode"):
+        self.group_by = group_by
+        self._lock = threading.Lock()
+        self.durations = defaultdict(list)   # (group, span) -> [seconds]
+        self.cpu = defaultdict(float)        # (group, span) -> thread CPU seconds
+        self.llm_calls = defaultdict(int)    # session -> calls
+
+    def __call__(self, sp):
+        group = sp.attrs.get(self.group_by, "background")
+        with self._lock:
+            self.durations[(group, sp.name)].append(sp.duration)
+            self.cpu[(group, sp.name)] += sp.cpu
+            if sp.name == "llm":
+                self.llm_calls[sp.attrs.get("session")] += 1
+
+    def __enter__(self):
+        telemetry.add_listener(self)
+        return self
+
+    def __exit__(self, *exc):
+        telemetry.remove_listener(self)
+
+    def clear(self):
+        with self._lock:
+            self.durations.clear()
+            self.cpu.clear()
+            self.llm_calls.clear()
+
+    def latency(self) -> dict:
+        """{"<group>/<span>": {n, p50, p95, p99}}"""
+        with self._lock:
+            items = [(k, list(v)) for k, v in self.durations.items()]
+        return {f"{g}/{name}": percentiles(v) for (g, name), v in sorted(items)}
@@ -0,0 +1,118 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import wave
+from pathlib import Path
+import numpy as np
+
+# Offline stand-ins for the bench: no Ollama, no Whisper weights, no gTTS.
+#
+#   LLM -> llm_backends' fake backend ("{}" after LLM_FAKE_LATENCY_MS)
+#   STT -> StandinWhisper: "hears" whatever text synth_speech() registered for
+#          the clip, after sleeping audio seconds x real-time factor
+#   TTS -> "standin" backend: a sine-wave WAV, after sleeping per character
+#
+# Sleeps rather than busy loops: CTranslate2, the LLM HTTP call and espeak all
+# release the GIL, so a sleep is the closer model of how they overlap.
+SAMPLE_RATE = 16000
+STT_RTF = float(os.getenv("BENCH_STT_RTF", "0.15"))             # main model, s compute per s audio
+STT_FAST_RTF = float(os.getenv("BENCH_STT_FAST_RTF", "0.04"))   # fast tier
+TTS_MS_PER_CHAR = float(os.getenv("BENCH_TTS_MS_PER_CHAR", "0.5"))
+
+_FAST_MODELS = {"tiny", "tiny.en", "base", "base.en", "small", "small.en"}
+
+_transcripts = {}  # clip fingerprint -> text
+_lock = threading.Lock()
+
+
+def _fingerprint(audio) -> str:
+    return hashlib.sha1(np.ascontiguousarray(audio, dtype=np.float32).tobytes()).hexdigest()
+
+
+def register_clip(audio, text: str):
+    """Make StandinWhisper transcribe this exact clip (16 kHz float32) as `text`."""
+    with _lock:
+        _transcripts[_fingerprint(audio)] = text
+
+
+def synth_speech(text: str) -> np.ndarray:
+    """Deterministic 16 kHz float32 clip, ~70 ms per character, that StandinWhisper transcribes as `text`."""
+    n = int(SAMPLE_RATE * (0.3 + 0.07 * len(text)))
+    rng = np.random.default_rng(int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16))
+    t = np.arange(n, dtype=np.float32) / SAMPLE_RATE
+    audio = 0.3 * np.sin(2 * np.pi * 180 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    audio = (audio + 0.02 * rng.standard_normal(n)).astype(np.float32)
+    register_clip(audio, text)
+    return audio
+
+
+class _Segment:
+    __slots__ = ("text", "avg_logprob")
+
+    def __init__(self, text, avg_logprob):
+        self.text = text
+        self.avg_logprob = avg_logprob
+
+
+class _Info:
+    __slots__ = ("duration",)
+
+    def __init__(self, duration):
+        self.duration = duration
+
+
+class StandinWhisper:
+    """Same transcribe() shape as faster_whisper.WhisperModel (lazy segments + info)."""
+
+    def __init__(self, model_size: str, cpu_threads: int = 0):
+        self.model_size = model_size
+        self.rtf = STT_FAST_RTF if model_size in _FAST_MODELS else STT_RTF
+
+    def transcribe(self, audio, **kwargs):
+        duration = len(audio) / SAMPLE_RATE
+        text = _transcripts.get(_fingerprint(audio), "")
+
+        def segments():
+            time.sleep(duration * self.rtf)
+            if text:
+                yield _Segment(text, -0.3)
+
+        return segments(), _Info(duration)
+
+
+def _standin_tts(text: str, language_code: str) -> bytes:
+    time.sleep(len(text) * TTS_MS_PER_CHAR / 1000)
+    sr = 22050
+    t = np.arange(int(sr * 0.06 * max(1, len(text)))) / sr
+    pcm = (np.sin(2 * np.pi * 220 * t) * 8000).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def install(work_dir: Path):
+    """
+    Point every backend at a stand-in and every store at work_dir.
+    Must run before agent_core / speech / tts are imported (they read the env at import).
+    """
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["TTS_BACKEND"] = "standin"
+    os.environ["TTS_CACHE_DIR"] = str(work_dir / "tts_cache")
+    os.environ["APP_STORE_PATH"] = str(work_dir / "applications.jsonl")
+    os.environ["APP_STORE_COMPACT_EVERY_S"] = "0"
+    os.environ["SESSION_STORE"] = "memory"
+    os.environ.setdefault("METRICS_PORT", "0")
+
+    import tts_backends
+    tts_backends.register_backend("standin", _standin_tts, ".wav")
+
+    import speech
+    speech.use_model_factory(StandinWhisper)
@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class FileJanitor:
+    """
+    Background thread that deletes files older than `ttl` seconds under the
+    given directories (e.g. Gradio's upload/output temp dir), so long-running
+    nodes don't fill up their disks with per-turn audio.
+    """
+
+    def __init__(self, dirs, ttl: float, every: float = 300.0):
+        self.dirs = [Path(d) for d in dirs]
+        self.ttl = ttl
+        self.every = every
+        self.removed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self) -> int:
+        cutoff = time.time() - self.ttl
+        n = 0
+        for root in self.dirs:
+            if not root.exists():
+                continue
+            for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+                for name in filenames:
+                    p = os.path.join(dirpath, name)
+                    try:
+                        if os.stat(p).st_mtime < cutoff:
+                            os.unlink(p)
+                            n += 1
+                    except OSError:
+                        continue  # in use / already gone
+                # drop empty per-file dirs (Gradio stores each file in its own dir)
+                if dirpath != str(root):
+                    try:
+                        os.rmdir(dirpath)
+                    except OSError:
+                        pass
+        self.removed += n
+        return n
+
+    def _run(self):
+        while not self._stop.wait(self.every):
+            self.sweep()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="file-janitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
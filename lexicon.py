@@ -0,0 +1,184 @@
+import json
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+
+
+def _nfc(s: str) -> str:
+    # STT output and hand-typed tables may differ in nukta/matra composition
+    return unicodedata.normalize("NFC", s)
+
+
+class Scan:
+    """
+    Everything found in one pass over a normalized (lowercased) utterance.
+      matches: [(start, end, kind, value)] for every lexicon entry, overlapping
+      numbers:  [(start, end, digits)] for every run of digits (with optional .decimals)
+    """
+
+    __slots__ = ("text", "matches", "numbers")
+
+    def __init__(self, text, matches, numbers):
+        self.text = text
+        self.matches = matches
+        self.numbers = numbers
+
+    def has(self, kind, value=None) -> bool:
+        for _, _, k, v in self.matches:
+            if k == kind and (value is None or v == value):
+                return True
+        return False
+
+    def first(self, kind):
+        """Value of the leftmost (then longest) match of this kind, or None."""
+        best = None
+        for s, e, k, v in self.matches:
+            if k == kind and (best is None or s < best[0] or (s == best[0] and e > best[1])):
+                best = (s, e, v)
+        return best[2] if best else None
+
+    def values(self, kind) -> set:
+        return {v for _, _, k, v in self.matches if k == kind}
+
+    def whole(self, kind):
+        """Value if one entry of this kind spans the entire text (e.g. the answer is just "दो")."""
+        n = len(self.text)
+        for s, e, k, v in self.matches:
+            if k == kind and s == 0 and e == n:
+                return v
+        return None
+
+    def first_number(self):
+        """
+        Leftmost number word, combining "tens + units" spoken as two words
+        (Tamil "இருபத்தி ஒன்று", Telugu "ఇరవై ఒకటి" -> 21).
+        """
+        nums = sorted((s, -e, v) for s, e, k, v in self.matches if k == "number")
+        if not nums:
+            return None
+        s0, neg_e0, v0 = nums[0]
+        if v0 >= 20 and v0 % 10 == 0:
+            rest = self.text[-neg_e0:]
+            gap = len(rest) - len(rest.lstrip())
+            for s, neg_e, v in nums:
+                if s == -neg_e0 + gap and v < 10:
+                    return v0 + v
+        return v0
+
+
+class Lexicon:
+    """
+    Compiled lexicon for the deterministic parsers.
+
+    - normalize(): every STT fix rule applied by ONE combined regex
+      (longest surface first), instead of a chain of str.replace calls
+    - scan(): an Aho-Corasick automaton over all surface forms (number words,
+      states, categories, genders, yes/no, hint words) plus digit runs, in a
+      single pass over the text. Every occurrence is reported, overlapping
+      ones included, so `surface in text` semantics are preserved.
+
+    Both are memoized, so the six parsers that run on the same turn share one
+    normalization and one scan.
+    """
+
+    def __init__(self, fixes: dict, entries):
+        """
+        fixes:   {wrong surface: replacement}
+        entries: iterable of (surface, kind, value); a surface may carry several
+                 (kind, value) pairs, e.g. "ओबीसी" is a category and a category hint.
+        """
+        self.fixes = {_nfc(k): v for k, v in fixes.items()}
+        keys = sorted(self.fixes, key=len, reverse=True)
+        self._fix_re = re.compile("|".join(re.escape(k) for k in keys)) if keys else None
+
+        # --- Aho-Corasick: goto / fail / output over lowercased surfaces ---
+        self._goto = [{}]
+        self._out = [[]]
+        for surface, kind, value in entries:
+            surface = _nfc(surface).lower()
+            node = 0
+            for ch in surface:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(surface), kind, value))
+
+        self._fail = [0] * len(self._goto)
+        q = deque(self._goto[0].values())
+        while q:
+            node = q.popleft()
+            for ch, nxt in self._goto[node].items():
+                q.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+        self.normalize = lru_cache(maxsize=2048)(self._normalize)
+        self.scan = lru_cache(maxsize=2048)(self._scan)
+
+    def _normalize(self, text: str) -> str:
+        t = _nfc(text or "")
+        if self._fix_re is not None:
+            t = self._fix_re.sub(lambda m: self.fixes[m.group(0)], t)
+        return t.strip()
+
+    def _scan(self, text: str) -> Scan:
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        numbers = []
+        num_start = None
+        node = 0
+        t = text.lower()
+        for i, ch in enumerate(t):
+            # digit runs ("20", "2.5"), tracked in the same pass
+            if ch.isdecimal():
+                if num_start is None:
+                    num_start = i
+            elif not (ch == "." and num_start is not None and i + 1 < len(t) and t[i + 1].isdecimal()):
+                if num_start is not None:
+                    numbers.append((num_start, i, t[num_start:i]))
+                    num_start = None
+
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for n, kind, value in out[node]:
+                matches.append((i + 1 - n, i + 1, kind, value))
+        if num_start is not None:
+            numbers.append((num_start, len(t), t[num_start:]))
+        return Scan(t, matches, numbers)
+
+
+def load_pack(path):
+    """
+    Per-language lexicon pack (data/lexicons/<code>.json) -> (fixes, entries)
+    in the same shape the Lexicon constructor takes.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        pack = json.load(f)
+
+    entries = []
+    for w, v in pack.get("numbers", {}).items():
+        entries.append((w, "number", v))
+    for w, v in pack.get("ordinals", {}).items():
+        entries.append((w, "ordinal", v))
+    for w in pack.get("yes", []):
+        entries.append((w, "yes_no", True))
+    for w in pack.get("no", []):
+        entries.append((w, "yes_no", False))
+    for w in pack.get("lakh", []):
+        entries.append((w, "unit", 100000))
+    for kind, key in (("gender", "gender"), ("category", "category"), ("state", "states")):
+        for value, words in pack.get(key, {}).items():
+            entries.extend((w, kind, value) for w in words)
+    for field, words in pack.get("hints", {}).items():
+        entries.extend((w, "hint", field) for w in words)
+    return pack.get("fixes", {}), entries
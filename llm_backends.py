@@ -1,5 +1,7 @@
 import os
+import time
 import requests
+from telemetry import span
 
 # OLLAMA_HOST = os.getenv("OLLAMA_URL", "http://localhost:11434").rstrip("/")
 # OLLAMA_MODEL = os.getenv("LLM_MODEL", "llama3.2:3b")
@@ -7,6 +9,11 @@ import requests
 OLLAMA_BASE = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:latest")  # ✅ your installed model
 
+# ollama -> local Ollama server
+# fake   -> no server: answers "{}" (the agent falls back to its own parsers); for benches
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama")
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "0"))  # simulated round trip
+
 def _messages_to_prompt(messages):
     # Convert chat messages to a single prompt for /api/generate fallback
     lines = []
@@ -21,29 +28,42 @@ def _post(url, payload, timeout=120):
     return requests.post(url, json=payload, timeout=timeout)
 
 
+def _fake_chat(messages):
+    if LLM_FAKE_LATENCY_MS > 0:
+        time.sleep(LLM_FAKE_LATENCY_MS / 1000)
+    return "{}"
+
+
 def ollama_chat(messages, model=OLLAMA_MODEL, timeout=120):
-    # 1) Ollama native chat
-    try:
+    if LLM_BACKEND == "fake":
+        with span("llm", model="fake", backend="fake"):
+            return _fake_chat(messages)
+
+    with span("llm", model=model, backend="ollama") as sp:
+        # 1) Ollama native chat
+        try:
+            r = requests.post(
+                f"{OLLAMA_BASE}/api/chat",
+                json={"model": model, "messages": messages, "stream": False},
+                timeout=timeout,
+            )
+            r.raise_for_status()
+            data = r.json()
+            sp.set(outcome="chat")
+            return data.get("message", {}).get("content", "")
+        except Exception:
+            pass
+
+        # 2) OpenAI-compatible chat fallback
         r = requests.post(
-            f"{OLLAMA_BASE}/api/chat",
+            f"{OLLAMA_BASE}/v1/chat/completions",
             json={"model": model, "messages": messages, "stream": False},
             timeout=timeout,
         )
         r.raise_for_status()
         data = r.json()
-        return data.get("message", {}).get("content", "")
-    except Exception:
-        pass
-
-    # 2) OpenAI-compatible chat fallback
-    r = requests.post(
-        f"{OLLAMA_BASE}/v1/chat/completions",
-        json={"model": model, "messages": messages, "stream": False},
-        timeout=timeout,
-    )
-    r.raise_for_status()
-    data = r.json()
-    return data["choices"][0]["message"]["content"]
+        sp.set(outcome="openai_fallback")
+        return data["choices"][0]["message"]["content"]
 
 def generate_reply(user_text: str, history: list, language_name: str) -> str:
     system_prompt = (
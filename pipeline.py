@@ -0,0 +1,86 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from telemetry import start_span
+from profiling import run_attached
+
+# Each stage of a voice turn (STT -> agent/LLM -> TTS) runs on its own bounded
+# thread pool, so a slow Ollama call for one session doesn't hold a Whisper
+# worker, and TTS for one caller overlaps STT for the next.
+PIPELINE_MAX_TURNS = int(os.getenv("PIPELINE_MAX_TURNS", "64"))  # Gradio events in flight
+
+
+class StageBusy(RuntimeError):
+    """Raised when a stage already has `workers + max_pending` calls admitted."""
+
+
+class Stage:
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "rejected": 0, "pending": 0}
+
+    def _get_executor(self):
+        # created on first use, i.e. after any fork, so each process has its own threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"stage-{self.name}")
+        return self._executor
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on this stage's pool; spans inside keep the caller's turn attributes (and profile)."""
+        with self._lock:
+            if self._stats["pending"] >= self.capacity:
+                self._stats["rejected"] += 1
+                raise StageBusy(self.name)
+            self._stats["pending"] += 1
+            self._stats["submitted"] += 1
+
+        queued = start_span("queue_wait", stage=self.name)
+        ctx = contextvars.copy_context()
+
+        def call():
+            queued.end()
+            return ctx.run(run_attached, functools.partial(fn, *args, **kwargs))  # sampled if the turn is profiled
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), call)
+        finally:
+            with self._lock:
+                self._stats["pending"] -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"stage": self.name, "workers": self.workers, "capacity": self.capacity, **self._stats}
+
+
+# a tiered STT call can hold a fast-model and then a main-model Whisper worker;
+# read from the env (not speech.py) so text-only users don't load Whisper
+_STT_DEFAULT_WORKERS = 2 * max(1, int(os.getenv("WHISPER_WORKERS", "1")))
+
+STT = Stage(
+    "stt",
+    int(os.getenv("PIPELINE_STT_WORKERS", "0")) or _STT_DEFAULT_WORKERS,
+    int(os.getenv("PIPELINE_STT_QUEUE", os.getenv("WHISPER_QUEUE_SIZE", "16"))),
+)
+AGENT = Stage(
+    "agent",  # mostly waiting on Ollama over HTTP, so more threads than cores is fine
+    int(os.getenv("PIPELINE_AGENT_WORKERS", "8")),
+    int(os.getenv("PIPELINE_AGENT_QUEUE", "64")),
+)
+TTS = Stage(
+    "tts",
+    int(os.getenv("PIPELINE_TTS_WORKERS", "4")),
+    int(os.getenv("PIPELINE_TTS_QUEUE", "64")),
+)
+
+
+def pipeline_stats() -> dict:
+    return {s.name: s.stats() for s in (STT, AGENT, TTS)}
@@ -0,0 +1,206 @@
+import argparse
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+
+# Pre-fork launcher: load the read-only, expensive parts once in a parent, then
+# fork workers that share those pages copy-on-write.
+#
+#   python prefork.py text --workers 8        # text API workers on one shared listening socket
+#   python prefork.py ui --workers 4          # Gradio workers on ports 7860, 7861, ... (sticky LB in front;
+#                                             #   SESSION_STORE=sqlite so any worker can continue a session)
+#
+# Shared: MiniLM encoder + FAISS index + scheme catalogue, rules, lexicon packs,
+# and every imported module (torch, gradio, numpy ...).
+# Not shared: Whisper. CTranslate2 starts its replica threads when a model is
+# built and threads don't survive fork(), so the parent only reads the model
+# files into the page cache and each UI worker builds its own pool after fork.
+#
+# Thread pools: nothing in the parent may start a thread or run inference
+# (torch/OpenMP pools, tokenizers). Every pool in the app (pipeline stages,
+# prefetch, text-API batch, store compactor) is created lazily, i.e. in the worker.
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", "2"))
+PREFORK_REPORT_S = float(os.getenv("PREFORK_REPORT_S", "0"))  # print the memory report every N s (0 = on SIGUSR1 only)
+
+_ROLLUP_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+
+# ----------------------------
+# Preload (parent only)
+# ----------------------------
+def preload(app: str):
+    t0 = time.perf_counter()
+    import agent_core
+    from tools.eligibility import load_rules, rule_fields, rule_index
+
+    for code in agent_core.LANG_CODES.values():
+        agent_core.lexicon_for(code)
+    load_rules()
+    rule_fields()
+    rule_index()
+
+    if agent_core.search_schemes is not None:
+        from tools.retriever import preload as preload_retriever
+        preload_retriever()
+
+    if app == "ui":
+        import gradio  # noqa: F401  (module pages shared; the Blocks are built per worker)
+        import speech
+        try:
+            speech.warm_model_files()
+        except Exception as e:
+            print(f"prefork: Whisper files not warmed ({type(e).__name__}: {e})", file=sys.stderr)
+
+    stray = [t.name for t in threading.enumerate() if t is not threading.main_thread()]
+    if stray:
+        print(f"prefork: threads running before fork (they won't exist in workers): {stray}", file=sys.stderr)
+    print(f"prefork: preloaded in {time.perf_counter() - t0:.1f} s, rss {smaps_rollup(os.getpid()).get('Rss', 0) // 1024} MB")
+
+
+# ----------------------------
+# Memory report
+# ----------------------------
+def smaps_rollup(pid: int) -> dict:
+    """kB per field from /proc/<pid>/smaps_rollup (Linux 4.14+); {} elsewhere."""
+    out = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in _ROLLUP_FIELDS:
+                    out[key] = int(rest.split()[0])
+    except (OSError, ValueError):
+        return {}
+    return out
+
+
+def memory_report(procs: dict) -> str:
+    """procs: {label: pid}. Private = only this process; shared = pages also mapped by another."""
+    lines = [f"{'process':12} {'pid':>8} {'rss MB':>8} {'pss MB':>8} {'shared MB':>10} {'private MB':>11}"]
+    total_pss = 0
+    for label, pid in procs.items():
+        m = smaps_rollup(pid)
+        if not m:
+            lines.append(f"{label:12} {pid:>8} {'n/a':>8}")
+            continue
+        shared = m.get("Shared_Clean", 0) + m.get("Shared_Dirty", 0)
+        private = m.get("Private_Clean", 0) + m.get("Private_Dirty", 0)
+        total_pss += m.get("Pss", 0)
+        lines.append(f"{label:12} {pid:>8} {m.get('Rss', 0) / 1024:>8.1f} {m.get('Pss', 0) / 1024:>8.1f} "
+                     f"{shared / 1024:>10.1f} {private / 1024:>11.1f}")
+    lines.append(f"total PSS (real footprint): {total_pss / 1024:.1f} MB")
+    return "\n".join(lines)
+
+
+# ----------------------------
+# Workers
+# ----------------------------
+def _run_worker(app: str, index: int, sock, port: int):
+    if app == "text":
+        import text_api
+        text_api.serve(sock=sock)
+    else:
+        import app as ui
+        from telemetry import METRICS_PORT
+        ui.main(server_port=port + index, metrics_port=METRICS_PORT + index if METRICS_PORT else 0)
+
+
+def _spawn(app: str, index: int, sock, port: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    # child
+    code = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        gc.enable()
+        random.seed()  # don't share the parent's PRNG state
+        if index:
+            # one application-store compactor per data dir: worker 0's
+            import tools.application_store as app_store
+            app_store.APP_STORE_COMPACT_EVERY_S = 0
+        _run_worker(app, index, sock, port)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit(code)  # never return into the parent's supervise loop
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Preload models once, fork workers that share them")
+    ap.add_argument("app", choices=["text", "ui"])
+    ap.add_argument("--workers", type=int, default=PREFORK_WORKERS)
+    ap.add_argument("--host", default=os.getenv("TEXT_API_HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, help="text: the shared port; ui: first worker's port")
+    args = ap.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("prefork needs fork() (Linux/macOS); run app.py / text_api.py directly")
+
+    if args.port is None:
+        args.port = int(os.getenv("TEXT_API_PORT", "8081")) if args.app == "text" else int(os.getenv("GRADIO_SERVER_PORT", "7860"))
+
+    # no collections while loading, then move everything loaded to the permanent
+    # generation so workers' GC passes don't write to (and un-share) those pages
+    gc.disable()
+    preload(args.app)
+
+    sock = None
+    if args.app == "text":
+        sock = socket.create_server((args.host, args.port), backlog=1024)
+        print(f"text API on http://{args.host}:{args.port}/v1/turn ({args.workers} workers)")
+
+    gc.freeze()
+
+    workers = {}  # pid -> index
+    for i in range(args.workers):
+        workers[_spawn(args.app, i, sock, args.port)] = i
+
+    stopping = False
+    report_due = [False]
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, lambda *_: report_due.__setitem__(0, True))
+
+    next_report = time.monotonic() + PREFORK_REPORT_S if PREFORK_REPORT_S > 0 else None
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            index = workers.pop(pid)
+            if not stopping:
+                print(f"prefork: worker {index} (pid {pid}) exited with {os.waitstatus_to_exitcode(status)}; restarting",
+                      file=sys.stderr)
+                time.sleep(1)  # don't spin if it dies on startup
+                workers[_spawn(args.app, index, sock, args.port)] = index
+            continue
+
+        if report_due[0] or (next_report is not None and time.monotonic() >= next_report):
+            report_due[0] = False
+            if next_report is not None:
+                next_report = time.monotonic() + PREFORK_REPORT_S
+            procs = {"parent": os.getpid(), **{f"worker {i}": p for p, i in sorted(workers.items(), key=lambda kv: kv[1])}}
+            print(memory_report(procs), flush=True)
+        time.sleep(0.2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+import telemetry
+
+# Opt-in sampling profiler for single turns. A background thread reads every
+# attached thread's Python stack via sys._current_frames() every few ms; nothing
+# is traced, so the turn runs at full speed, and when no turn is flagged there is
+# no sampler thread at all.
+#
+#   PROFILE_TURNS=1            every turn
+#   PROFILE_TURNS=0.02         ~2% of turns
+#   PROFILE_SESSIONS=abc,def   every turn of these sessions (or watch_session() at runtime)
+#
+# Per flagged turn, PROFILE_DIR gets:
+#   <session>-<turn>-<ts>.collapsed   "thread;frame;frame;... count" lines
+#                                     (flamegraph.pl, speedscope, inferno)
+#   <session>-<turn>-<ts>.json        samples, wall time, the turn's spans and agent trace
+# <session> is the id reduced to [A-Za-z0-9_-] (plus a short hash if anything
+# was replaced); the .json keeps the original. Every span of that turn carries
+# flamegraph=<file stem> in TELEMETRY_JSONL.
+PROFILE_TURNS = os.getenv("PROFILE_TURNS", "0")
+PROFILE_SESSIONS = {s.strip() for s in os.getenv("PROFILE_SESSIONS", "").split(",") if s.strip()}
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "data/profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+try:
+    _turn_rate = float(PROFILE_TURNS)
+except ValueError:
+    _turn_rate = 1.0 if PROFILE_TURNS.lower() in ("all", "true", "yes") else 0.0
+
+_capture = ContextVar("profile_capture", default=None)
+
+_lock = threading.Lock()
+_attached = {}  # thread ident -> Capture being sampled on it
+_sampler = None
+_labels = {}    # code object -> "func (file.py:line)"
+
+
+def watch_session(session_id: str, on: bool = True):
+    """Profile every following turn of this session (or stop)."""
+    if on:
+        PROFILE_SESSIONS.add(session_id)
+    else:
+        PROFILE_SESSIONS.discard(session_id)
+
+
+def wanted(session_id) -> bool:
+    if session_id in PROFILE_SESSIONS:
+        return True
+    return _turn_rate >= 1.0 or (_turn_rate > 0 and random.random() < _turn_rate)
+
+
+def _safe_name(session) -> str:
+    """File-name part for a session id (client-supplied over the text API): [A-Za-z0-9_-] only."""
+    s = str(session)
+    clean = re.sub(r"[^A-Za-z0-9_-]", "_", s)[:64]
+    if clean != s:
+        clean += "_" + hashlib.sha1(s.encode("utf-8")).hexdigest()[:8]  # keep distinct ids distinct
+    return clean
+
+
+class Capture:
+    """Stack counts and spans for one turn."""
+
+    def __init__(self, session, turn):
+        self.session = session
+        self.turn = turn
+        self.stem = f"{_safe_name(session)}-{turn}-{int(time.time() * 1000)}"
+        self.stacks = {}  # collapsed stack -> samples
+        self.samples = 0
+        self.spans = []
+        self.attrs = {}
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.wall = None  # set when the turn ends; late stage work is no longer sampled
+
+    def set(self, **attrs):
+        """Extra fields for the .json file (e.g. the agent's turn trace)."""
+        self.attrs.update(attrs)
+        return self
+
+    def add(self, stack: str):
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+
+    def write(self, out_dir: Path = None) -> Path:
+        out_dir = Path(out_dir or PROFILE_DIR)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        collapsed = out_dir / (self.stem + ".collapsed")
+        lines = [f"{stack} {n}" for stack, n in sorted(self.stacks.items())]
+        collapsed.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        (out_dir / (self.stem + ".json")).write_text(json.dumps({
+            "session": self.session,
+            "turn": self.turn,
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "samples": self.samples,
+            "wall_ms": round(self.wall * 1000, 3) if self.wall is not None else None,
+            "spans": self.spans,
+            **self.attrs,
+        }, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+        return collapsed
+
+
+# ----------------------------
+# Sampler
+# ----------------------------
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def _collapse(frame, thread_name: str) -> str:
+    names = []
+    while frame is not None:
+        names.append(_label(frame.f_code))
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+def _sample_loop():
+    global _sampler
+    interval = PROFILE_INTERVAL_MS / 1000
+    me = threading.get_ident()
+    while True:
+        time.sleep(interval)
+        with _lock:
+            if not _attached:
+                _sampler = None  # started again by the next flagged turn
+                return
+            attached = dict(_attached)
+        frames = sys._current_frames()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for tid, cap in attached.items():
+            frame = frames.get(tid)
+            if frame is not None and tid != me:
+                cap.add(_collapse(frame, names.get(tid, str(tid))))
+
+
+def _attach(tid: int, cap: Capture):
+    global _sampler
+    with _lock:
+        prev = _attached.get(tid)
+        _attached[tid] = cap
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="profile-sampler", daemon=True)
+            _sampler.start()
+    return prev
+
+
+def _detach(tid: int, prev):
+    with _lock:
+        if prev is not None:
+            _attached[tid] = prev
+        else:
+            _attached.pop(tid, None)
+
+
+def run_attached(fn):
+    """fn() on this thread, sampled into the current turn's capture if the turn is flagged."""
+    cap = _capture.get()
+    if cap is None or cap.wall is not None:
+        return fn()
+    tid = threading.get_ident()
+    prev = _attach(tid, cap)
+    try:
+        return fn()
+    finally:
+        _detach(tid, prev)
+
+
+# ----------------------------
+# Turns
+# ----------------------------
+_by_turn = {}  # (session, turn) -> Capture, for routing finished spans
+
+
+def _on_span(sp):
+    cap = _by_turn.get((sp.attrs.get("session"), sp.attrs.get("turn")))
+    if cap is not None:
+        cap.spans.append({
+            "span": sp.name,
+            "start_ms": round((sp.start - cap.started_at) * 1000, 3),
+            "ms": round(sp.duration * 1000, 3),
+            "cpu_ms": round(sp.cpu * 1000, 3),
+            **{k: v for k, v in sp.attrs.items() if k not in ("session", "turn", "flamegraph")},
+        })
+
+
+@contextmanager
+def profile_turn(session, turn, this_thread: bool = True):
+    """
+    Sample this turn's stacks if it is flagged (PROFILE_TURNS / PROFILE_SESSIONS);
+    otherwise a no-op. Stage threads join through pipeline.Stage.run.
+    this_thread=False for coroutines: the event loop thread also runs other sessions.
+    Yields the Capture (or None).
+    """
+    if not (_turn_rate > 0 or PROFILE_SESSIONS) or not wanted(session):
+        yield None
+        return
+
+    cap = Capture(session, turn)
+    key = (session, turn)
+    with _lock:
+        if not _by_turn:
+            telemetry.add_listener(_on_span)
+        _by_turn[key] = cap
+    token = _capture.set(cap)
+    tid = threading.get_ident()
+    prev = _attach(tid, cap) if this_thread else None
+    try:
+        with telemetry.turn_context(flamegraph=cap.stem):
+            yield cap
+    finally:
+        if this_thread:
+            _detach(tid, prev)
+        _capture.reset(token)
+        cap.wall = time.perf_counter() - cap.t0
+        with _lock:
+            _by_turn.pop(key, None)
+            if not _by_turn:
+                telemetry.remove_listener(_on_span)
+        try:
+            cap.write()
+        except OSError as e:
+            print(f"profiling: {cap.stem} not written ({e})", file=sys.stderr)
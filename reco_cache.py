@@ -0,0 +1,41 @@
+import os
+import threading
+from collections import OrderedDict
+
+RECO_CACHE_SIZE = int(os.getenv("RECO_CACHE_SIZE", "4096"))
+
+
+class RecoCache:
+    """
+    Bounded LRU shared by all sessions in the process.
+    Keys carry the catalogue / rules versions, so a reload simply makes old
+    entries unreachable and they age out.
+    """
+
+    def __init__(self, max_entries: int = RECO_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
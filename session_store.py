@@ -0,0 +1,244 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from telemetry import span
+
+# memory -> in-process LRU (single worker)
+# sqlite -> local SQLite file in WAL mode, shared by every worker on the node
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_DB = Path(os.getenv("SESSION_DB", "data/sessions.db"))
+SESSION_TTL_S = float(os.getenv("SESSION_TTL_S", "3600"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_HISTORY_MAX = int(os.getenv("SESSION_HISTORY_MAX", "50"))  # chat pairs kept per session
+
+NEW_MEMORY = {"stage": "INTAKE", "profile": {}, "pending_confirm": None}
+
+
+# ----------------------------
+# Compact records
+# ----------------------------
+def compact(memory: dict, history) -> dict:
+    """
+    Agent memory + chat pairs -> JSON-able record.
+    Schemes are stored by id, eligibility only as status/missing_fields,
+    and the per-turn trace list and reply fragments are dropped (last_trace
+    keeps the summary; reply_parts only lives for the turn that made it).
+    """
+    rec = {k: v for k, v in memory.items() if k not in ("turn_trace", "reply_parts", "last_results", "selected_scheme")}
+
+    ranked = memory.get("last_results")
+    if ranked:
+        rec["last_results"] = [
+            [r["scheme_id"], {"status": e.get("status"), "missing_fields": e.get("missing_fields", [])}, tag]
+            for r, e, tag in ranked
+        ]
+    else:
+        rec["last_results"] = None
+
+    selected = memory.get("selected_scheme")
+    rec["selected_scheme"] = selected["scheme_id"] if selected else None
+
+    rec["history"] = [list(p) for p in history[-SESSION_HISTORY_MAX:]]
+    return rec
+
+
+def expand(rec: dict, resolve_scheme):
+    """Record -> (memory, history); resolve_scheme(scheme_id) gives back the scheme dict."""
+    memory = {k: v for k, v in rec.items() if k != "history"}
+
+    ranked = []
+    for sid, e, tag in rec.get("last_results") or []:
+        r = resolve_scheme(sid)
+        if r is not None:
+            ranked.append((r, e, tag))
+    memory["last_results"] = ranked or None
+
+    selected = rec.get("selected_scheme")
+    memory["selected_scheme"] = resolve_scheme(selected) if selected else None
+
+    history = [tuple(p) for p in rec.get("history", [])]
+    return memory, history
+
+
+# ----------------------------
+# Backends: get(sid) -> record | None, update(sid, delta)
+# ----------------------------
+class MemorySessionStore:
+    """In-process LRU with TTL; sessions die with the process."""
+
+    backend = "memory"
+
+    def __init__(self, ttl: float = SESSION_TTL_S, max_sessions: int = SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # sid -> (last_seen, record), oldest first
+
+    def get(self, sid: str):
+        with self._lock:
+            item = self._data.get(sid)
+            if item is None:
+                return None
+            seen, rec = item
+            if time.time() - seen > self.ttl:
+                del self._data[sid]
+                self.evicted += 1
+                return None
+            self._data.move_to_end(sid)
+            return json.loads(json.dumps(rec))  # callers mutate; keep the stored copy clean
+
+    def update(self, sid: str, delta: dict):
+        delta = json.loads(json.dumps(delta))
+        now = time.time()
+        with self._lock:
+            _, rec = self._data.pop(sid, (now, {}))
+            rec.update(delta)
+            self._data[sid] = (now, rec)
+            self._evict(now)
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def _evict(self, now):
+        while self._data:
+            sid, (seen, _) = next(iter(self._data.items()))
+            if len(self._data) <= self.max_sessions and now - seen <= self.ttl:
+                break
+            del self._data[sid]
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": self.backend, "sessions": len(self._data), "evicted": self.evicted}
+
+
+class SQLiteSessionStore:
+    """
+    One row per (session, key), so a turn only rewrites the keys it changed.
+    WAL lets several worker processes read while one writes.
+    """
+
+    backend = "sqlite"
+    SWEEP_EVERY = 200  # writes between TTL sweeps
+
+    def __init__(self, path: Path = SESSION_DB, ttl: float = SESSION_TTL_S):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.evicted = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, seen REAL NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_kv ("
+            " sid TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (sid, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_seen ON sessions (seen)")
+
+    def get(self, sid: str):
+        with self._lock:
+            row = self._db.execute("SELECT seen FROM sessions WHERE sid = ?", (sid,)).fetchone()
+            if row is None or time.time() - row[0] > self.ttl:
+                return None
+            rows = self._db.execute("SELECT key, value FROM session_kv WHERE sid = ?", (sid,)).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    def update(self, sid: str, delta: dict):
+        now = time.time()
+        kv = [(sid, k, json.dumps(v, ensure_ascii=False)) for k, v in delta.items()]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO sessions (sid, seen) VALUES (?, ?)"
+                    " ON CONFLICT(sid) DO UPDATE SET seen = excluded.seen",
+                    (sid, now),
+                )
+                self._db.executemany(
+                    "INSERT INTO session_kv (sid, key, value) VALUES (?, ?, ?)"
+                    " ON CONFLICT(sid, key) DO UPDATE SET value = excluded.value",
+                    kv,
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._writes += 1
+            if self._writes % self.SWEEP_EVERY == 0:
+                self._sweep(now)
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._db.execute("DELETE FROM session_kv WHERE sid = ?", (sid,))
+            self._db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def _sweep(self, now):
+        cutoff = now - self.ttl
+        self._db.execute("DELETE FROM session_kv WHERE sid IN (SELECT sid FROM sessions WHERE seen < ?)", (cutoff,))
+        n = self._db.execute("DELETE FROM sessions WHERE seen < ?", (cutoff,)).rowcount
+        self.evicted += max(n, 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"backend": self.backend, "sessions": n, "evicted": self.evicted, "path": str(self.path)}
+
+
+# ----------------------------
+# What the app talks to
+# ----------------------------
+class Sessions:
+    """
+    load() -> (memory, history, record); save() diffs the new compact record
+    against the loaded one and writes only the keys that changed.
+    """
+
+    def __init__(self, store, resolve_scheme):
+        self.store = store
+        self.resolve_scheme = resolve_scheme
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def load(self, sid):
+        rec = self.store.get(sid) if sid else None
+        if rec is None:
+            # unknown or expired: start over
+            memory = json.loads(json.dumps(NEW_MEMORY))
+            return memory, [], {}
+        # memory gets its own copy: process_turn mutates nested dicts (profile) in
+        # place, and save() must still see the loaded values to find the delta
+        memory, history = expand(json.loads(json.dumps(rec)), self.resolve_scheme)
+        return memory, history, rec
+
+    def save(self, sid: str, memory: dict, history, rec: dict) -> dict:
+        new = compact(memory, history)
+        delta = {k: v for k, v in new.items() if rec.get(k, object()) != v}
+        if delta or not rec:
+            with span("session.save", backend=self.store.backend, keys=len(delta)):
+                self.store.update(sid, delta)
+        return new
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+
+def open_sessions(resolve_scheme, backend: str = SESSION_STORE) -> Sessions:
+    if backend == "sqlite":
+        store = SQLiteSessionStore()
+    elif backend == "memory":
+        store = MemorySessionStore()
+    else:
+        raise ValueError(f"unknown SESSION_STORE: {backend}")
+    return Sessions(store, resolve_scheme)
@@ -1,46 +1,398 @@
 import os
-import tempfile
-from gtts import gTTS
-from faster_whisper import WhisperModel
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+from telemetry import span
+from tts import tts_to_file, tts_audio, prerender_tts, tts_stats  # noqa: F401  (re-exported for app.py)
 
 # Load once (CPU works; GPU optional later)
 _MODEL_SIZE = os.getenv("WHISPER_MODEL", "medium")
-_whisper = WhisperModel(_MODEL_SIZE, device="cpu", compute_type="int8")
 
-def transcribe_audio(audio_path: str, language_code: str) -> str:
-    if not audio_path:
+# Pool sizing: N model instances, each with its own share of the cores.
+# On a 32-core box, e.g. WHISPER_WORKERS=4 -> 4 instances x 8 threads.
+_WORKERS = max(1, int(os.getenv("WHISPER_WORKERS", "1")))
+_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))        # 0 = cores // workers
+_QUEUE_SIZE = max(0, int(os.getenv("WHISPER_QUEUE_SIZE", "16")))  # max callers waiting
+_QUEUE_TIMEOUT = float(os.getenv("WHISPER_QUEUE_TIMEOUT", "30"))  # seconds
+
+# Fast tier for short constrained answers (yes/no, 1/2/3, age, category ...).
+# Set WHISPER_FAST_MODEL="" to disable tiering.
+_FAST_MODEL_SIZE = os.getenv("WHISPER_FAST_MODEL", "base")
+_FAST_WORKERS = max(1, int(os.getenv("WHISPER_FAST_WORKERS", str(_WORKERS))))
+_FAST_MAX_SECONDS = float(os.getenv("WHISPER_FAST_MAX_SECONDS", "4"))       # longer clips go to the main model
+_ESCALATE_LOGPROB = float(os.getenv("WHISPER_ESCALATE_LOGPROB", "-0.8"))  # below this -> re-run on main model
+
+# Streaming mode: a segment is closed once it is followed by this much silence
+_STREAM_MIN_SILENCE_MS = int(os.getenv("STT_STREAM_MIN_SILENCE_MS", "600"))
+_SAMPLE_RATE = 16000  # what Whisper expects
+
+
+class STTBusy(RuntimeError):
+    """Raised when the Whisper queue is full or a model could not be leased in time."""
+
+
+def _whisper_model(model_size: str, cpu_threads: int):
+    from faster_whisper import WhisperModel  # imported on first pool, not on `import speech`
+
+    return WhisperModel(model_size, device="cpu", compute_type="int8",
+                        cpu_threads=cpu_threads, num_workers=1)
+
+
+# builds one pool instance: factory(model_size, cpu_threads) -> object with .transcribe()
+_model_factory = _whisper_model
+
+
+def use_model_factory(factory):
+    """Swap the model class (e.g. a bench stand-in). Only affects pools not built yet."""
+    global _model_factory
+    _model_factory = factory
+
+
+class WhisperPool:
+    """
+    Fixed pool of WhisperModel instances behind a bounded wait queue.
+
+    - every instance gets cpu_threads = cores // workers, so concurrent
+      transcriptions run on disjoint thread pools instead of thrashing one
+    - at most `max_waiting` callers may wait for a free instance; beyond that
+      (or after `timeout` seconds) STTBusy is raised -> caller can back off
+    - queue-wait metrics are kept for stats()
+    """
+
+    def __init__(self, model_size: str, workers: int, max_waiting: int, timeout: float, cpu_threads: int = 0):
+        cores = os.cpu_count() or 1
+        self.model_size = model_size
+        self.workers = workers
+        self.cpu_threads = cpu_threads or max(1, cores // workers)
+        self.timeout = timeout
+
+        self._free = queue.Queue()
+        for _ in range(workers):
+            self._free.put(_model_factory(model_size, self.cpu_threads))
+
+        # admission control: busy workers + waiting callers
+        self._slots = threading.BoundedSemaphore(workers + max_waiting)
+
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=1000)  # recent queue waits (seconds)
+        self._stats = {
+            "requests": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "in_flight": 0,
+            "waiting": 0,
+            "wait_total_s": 0.0,
+            "wait_max_s": 0.0,
+        }
+
+    @contextmanager
+    def model(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise STTBusy("whisper queue full")
+
+        t0 = time.monotonic()
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["waiting"] += 1
+        try:
+            try:
+                m = self._free.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise STTBusy("no whisper worker free")
+            finally:
+                waited = time.monotonic() - t0
+                with self._lock:
+                    self._stats["waiting"] -= 1
+                    self._stats["wait_total_s"] += waited
+                    self._stats["wait_max_s"] = max(self._stats["wait_max_s"], waited)
+                    self._waits.append(waited)
+
+            with self._lock:
+                self._stats["in_flight"] += 1
+            try:
+                yield m
+            finally:
+                with self._lock:
+                    self._stats["in_flight"] -= 1
+                self._free.put(m)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            waits = sorted(self._waits)
+        n = out["requests"]  # admitted only; rejected callers never waited
+        out["wait_avg_s"] = (out["wait_total_s"] / n) if n > 0 else 0.0
+        out["wait_p95_s"] = waits[int(0.95 * (len(waits) - 1))] if waits else 0.0
+        out["model"] = self.model_size
+        out["workers"] = self.workers
+        out["cpu_threads"] = self.cpu_threads
+        return out
+
+
+STT_WORKERS = _WORKERS
+
+_whisper_pool = None
+_fast_pool = None
+_pool_lock = threading.Lock()
+
+def _get_main_pool():
+    global _whisper_pool
+    if _whisper_pool is None:
+        with _pool_lock:
+            if _whisper_pool is None:
+                _whisper_pool = WhisperPool(_MODEL_SIZE, _WORKERS, _QUEUE_SIZE, _QUEUE_TIMEOUT, _CPU_THREADS)
+    return _whisper_pool
+
+
+def _get_fast_pool():
+    global _fast_pool
+    if _fast_pool is None:
+        with _pool_lock:
+            if _fast_pool is None:
+                _fast_pool = WhisperPool(_FAST_MODEL_SIZE, _FAST_WORKERS, _QUEUE_SIZE, _QUEUE_TIMEOUT, _CPU_THREADS)
+    return _fast_pool
+
+
+def load_models(fast: bool = False):
+    """Build the Whisper pool(s) now rather than on the first voice turn."""
+    _get_main_pool()
+    if fast and _FAST_MODEL_SIZE:
+        _get_fast_pool()
+
+
+def warm_model_files(fast: bool = True):
+    """
+    Download (if needed) and read the Whisper model files once, so every worker
+    loads them from the page cache. The models are not built here: CTranslate2
+    starts its replica threads in the constructor, and threads don't survive fork().
+    """
+    from faster_whisper.utils import download_model
+
+    sizes = [_MODEL_SIZE] + ([_FAST_MODEL_SIZE] if fast and _FAST_MODEL_SIZE else [])
+    for size in sizes:
+        path = size if os.path.isdir(size) else download_model(size)
+        for name in os.listdir(path):
+            with open(os.path.join(path, name), "rb") as f:
+                while f.read(1 << 24):
+                    pass
+
+
+def stt_stats() -> dict:
+    out = {"main": _get_main_pool().stats()}
+    if _fast_pool is not None:
+        out["fast"] = _fast_pool.stats()
+    return out
+
+
+_GENERAL_PROMPT_HI = (
+    "यह सरकारी योजनाओं की बातचीत है। "
+    "उम्र, आय, राज्य, श्रेणी (SC/ST/OBC/General/EWS), "
+    "और 1/2/3 जैसे विकल्प बोला जा सकता है।"
+)
+
+# field-specific priming for the fast tier (what the user is expected to say)
+_SLOT_PROMPTS_HI = {
+    "yes_no": "हाँ। नहीं। हाँ जी।",
+    "choice": "1, 2, 3। पहला, दूसरा, तीसरा।",
+    "age": "मेरी उम्र 20 साल है।",
+    "annual_income": "सालाना आय 50000 या 1 लाख या 2 लाख रुपये।",
+    "category": "SC, ST, OBC, General, EWS।",
+    "gender": "पुरुष। महिला।",
+    "is_student": "हाँ, मैं छात्र हूँ। नहीं।",
+    "state": "बिहार, झारखंड, उत्तर प्रदेश, राजस्थान।",
+}
+
+# stages where the reply is a forced choice regardless of expected_field
+_STAGE_SLOTS = {
+    "PENDING_CONFIRM": "yes_no",
+    "CONFIRM_SUBMIT": "yes_no",
+    "RECOMMEND": "choice",
+    "DONE": "choice",
+}
+
+def constrained_slot(expected_field=None, stage=None):
+    """What kind of short answer the agent is waiting for (None = free text)."""
+    if stage in _STAGE_SLOTS:
+        return _STAGE_SLOTS[stage]
+    if expected_field in _SLOT_PROMPTS_HI:
+        return expected_field
+    return None
+
+
+def _decode(pool, audio, language_code, beam_size, initial_prompt, max_seconds=None, vad_filter=True):
+    """
+    Returns (text, avg_logprob), or None if the clip is longer than max_seconds.
+    """
+    with span("stt.decode", model=pool.model_size) as sp, pool.model() as whisper:
+        segments, info = whisper.transcribe(
+            audio,
+            language=language_code,
+            vad_filter=vad_filter,
+            beam_size=beam_size,
+            temperature=0.0,                # ✅ less randomness
+            condition_on_previous_text=False,  # ✅ helps short answers
+            initial_prompt=initial_prompt,
+        )
+        # duration is known before decoding; don't waste the fast model on long clips
+        if max_seconds is not None and info.duration > max_seconds:
+            sp.set(outcome="too_long", audio_s=info.duration)
+            return None
+
+        # segments is lazy: decoding happens here, so keep the model leased
+        texts, logprobs = [], []
+        for seg in segments:
+            texts.append(seg.text.strip())
+            logprobs.append(seg.avg_logprob)
+        sp.set(audio_s=info.duration)
+
+    text = " ".join(texts).strip()
+    avg_logprob = (sum(logprobs) / len(logprobs)) if logprobs else float("-inf")
+    return text, avg_logprob
+
+
+def transcribe_audio(audio, language_code: str, expected_field=None, stage=None, validate=None) -> str:
+    """
+    audio: file path or 16 kHz mono float32 array.
+    expected_field/stage: what the agent just asked for. Short constrained
+    answers go to the fast model with greedy decoding; we escalate to the
+    main model on low log-prob, a too-long clip, or when validate(text)
+    (the agent's parser for that slot) rejects the text.
+    """
+    if audio is None or len(audio) == 0:
         return ""
 
-    segments, info = _whisper.transcribe(
-        audio_path,
-        language=language_code,
-        vad_filter=True,
-        beam_size=5,                    # ✅ better decoding
-        temperature=0.0,                # ✅ less randomness
-        condition_on_previous_text=False,  # ✅ helps short answers
-        initial_prompt=(
-            "यह सरकारी योजनाओं की बातचीत है। "
-            "उम्र, आय, राज्य, श्रेणी (SC/ST/OBC/General/EWS), "
-            "और 1/2/3 जैसे विकल्प बोला जा सकता है।"
-        ) if language_code == "hi" else None
-    )
+    slot = constrained_slot(expected_field, stage)
+    with span("stt", slot=slot) as sp:
+        if slot and _FAST_MODEL_SIZE:
+            prompt = _SLOT_PROMPTS_HI[slot] if language_code == "hi" else None
+            fast = _decode(_get_fast_pool(), audio, language_code, 1, prompt, max_seconds=_FAST_MAX_SECONDS)
+            if fast is not None:
+                text, logprob = fast
+                if text and logprob >= _ESCALATE_LOGPROB and (validate is None or validate(text)):
+                    sp.set(tier="fast")
+                    return text
+            sp.set(tier="escalated")
+        else:
+            sp.set(tier="main")
+
+        text, _ = _decode(
+            _get_main_pool(), audio, language_code,
+            5,                                  # ✅ better decoding
+            _GENERAL_PROMPT_HI if language_code == "hi" else None,
+        )
+        return text
+
+
+# ----------------------------
+# Streaming STT (VAD-chunked)
+# ----------------------------
+def to_whisper_audio(sr: int, data) -> np.ndarray:
+    """
+    Gradio numpy audio (sr, int16/float array, mono or (n, channels))
+    -> 16 kHz mono float32, which WhisperModel.transcribe takes directly
+    (no temp file, no ffmpeg decode). At most one new buffer is allocated
+    per step and none when the input is already 16 kHz mono float32.
+    """
+    a = np.asarray(data)
+    scale = 1.0 / float(np.iinfo(a.dtype).max + 1) if a.dtype.kind in "iu" else None
+
+    # mono + float32 in one pass (mean accumulates straight into float32)
+    if a.ndim > 1:
+        a = a.mean(axis=1, dtype=np.float32)
+    elif a.dtype != np.float32:
+        a = a.astype(np.float32)
+    if scale is not None:
+        a *= scale  # in place: `a` is always our own buffer here
+
+    if sr != _SAMPLE_RATE and len(a):
+        ratio = sr / _SAMPLE_RATE
+        if ratio == int(ratio) and ratio > 1:
+            # 48k/32k -> 16k: box-filter + decimate (cheap anti-aliasing)
+            k = int(ratio)
+            n = len(a) // k
+            a = a[: n * k].reshape(n, k).mean(axis=1, dtype=np.float32)
+        else:
+            n = int(round(len(a) / ratio))
+            a = np.interp(
+                np.arange(n, dtype=np.float32) * np.float32(ratio),
+                np.arange(len(a), dtype=np.float32),
+                a,
+            ).astype(np.float32, copy=False)
+    return np.ascontiguousarray(a)
+
 
-    text = " ".join(seg.text.strip() for seg in segments).strip()
-    return text
+def stream_start() -> dict:
+    return {"pending": np.zeros(0, dtype=np.float32), "texts": []}
 
 
+def stream_buffer(state: dict, chunk) -> dict:
+    """Append one mic chunk to the pending audio; nothing is decoded."""
+    state = state or stream_start()
+    if chunk is not None:
+        sr, data = chunk
+        state["pending"] = np.concatenate([state["pending"], to_whisper_audio(sr, data)])
+    return state
 
-def tts_to_file(text: str, language_code: str) -> str:
+
+def stream_decode(state: dict, language_code: str) -> dict:
     """
-    Returns a path to an mp3 file.
-    gTTS language codes: hi, bn, ta, te, mr, or, gu, kn, ml, pa, ur...
+    Transcribe every buffered segment that VAD considers finished (followed
+    by enough silence) and drop it from the buffer, so only the trailing
+    segment is left for stream_finish().
     """
-    if not text:
-        text = " "
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    state = state or stream_start()
+    pending = state["pending"]
+    if not len(pending):
+        return state
+
+    min_silence = _STREAM_MIN_SILENCE_MS * _SAMPLE_RATE // 1000
+    speech = get_speech_timestamps(pending, VadOptions(min_silence_duration_ms=_STREAM_MIN_SILENCE_MS))
+    closed = [ts for ts in speech if len(pending) - ts["end"] >= min_silence]
+
+    if not speech:
+        # pure silence so far: keep only a short tail so the buffer can't grow forever
+        state["pending"] = pending[-min_silence:]
+        return state
 
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-    tmp.close()
+    for ts in closed:
+        text, _ = _decode(
+            _get_main_pool(), pending[ts["start"]:ts["end"]], language_code, 5,
+            _GENERAL_PROMPT_HI if language_code == "hi" else None,
+            vad_filter=False,
+        )
+        if text:
+            state["texts"].append(text)
+        state["pending"] = pending[ts["end"]:]
+    return state
+
+
+def stream_finish(state: dict, language_code: str, expected_field=None, stage=None, validate=None) -> str:
+    """
+    End of speech: decode only the trailing segment. If nothing was closed
+    while the user spoke, this is a normal (tiered) short-answer transcription.
+    """
+    state = state or stream_start()
+    tail = state["pending"]
+    if not state["texts"]:
+        return transcribe_audio(tail, language_code, expected_field=expected_field, stage=stage, validate=validate)
 
-    tts = gTTS(text=text, lang=language_code)
-    tts.save(tmp.name)
-    return tmp.name
+    texts = list(state["texts"])
+    if len(tail):
+        text, _ = _decode(
+            _get_main_pool(), tail, language_code, 5,
+            _GENERAL_PROMPT_HI if language_code == "hi" else None,
+        )
+        if text:
+            texts.append(text)
+    return " ".join(texts).strip()
@@ -0,0 +1,229 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# METRICS_PORT=9108   -> Prometheus text on http://<host>:9108/metrics (0 = off)
+# TELEMETRY_JSONL=... -> every finished span appended as one JSON line
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+TELEMETRY_JSONL = os.getenv("TELEMETRY_JSONL", "")
+
+# seconds; covers a cached TTS hit (ms) up to a slow Ollama call (tens of s)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# span attributes that become metric labels; anything else (ids, text lengths) only goes to JSONL
+LABELS = ("model", "backend", "cache", "stage", "tier", "slot", "outcome", "profile")
+
+_turn_attrs = ContextVar("turn_attrs", default={})
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(BUCKETS, v)] += 1
+        self.sum += v
+        self.count += 1
+
+
+class Span:
+    """One timed stage. Attributes can be added while it is open (e.g. cache hit)."""
+
+    __slots__ = ("name", "attrs", "start", "duration", "cpu", "_t0", "_c0", "_tid")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration = None
+        self.cpu = None
+        self._t0 = time.perf_counter()
+        self._c0 = time.thread_time()
+        self._tid = threading.get_ident()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._t0
+            # thread CPU only means something if the span ends on the thread that opened it
+            self.cpu = time.thread_time() - self._c0 if threading.get_ident() == self._tid else 0.0
+            _record(self)
+        return self
+
+
+# ----------------------------
+# Aggregation
+# ----------------------------
+_lock = threading.Lock()
+_latency = {}  # (name, labels) -> Histogram
+_cpu = {}      # (name, labels) -> total thread CPU seconds
+_errors = {}   # (name, labels) -> count
+_jsonl = None
+_listeners = []  # fn(span) per finished span, e.g. a bench collecting raw samples
+
+
+def add_listener(fn):
+    _listeners.append(fn)
+
+
+def remove_listener(fn):
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+def _labels(attrs: dict) -> tuple:
+    return tuple((k, str(attrs[k])) for k in LABELS if attrs.get(k) is not None)
+
+
+def _record(sp: Span):
+    global _jsonl
+    key = (sp.name, _labels(sp.attrs))
+    with _lock:
+        h = _latency.get(key)
+        if h is None:
+            h = _latency[key] = Histogram()
+        h.observe(sp.duration)
+        _cpu[key] = _cpu.get(key, 0.0) + sp.cpu
+        if sp.attrs.get("error"):
+            _errors[key] = _errors.get(key, 0) + 1
+
+        if TELEMETRY_JSONL:
+            if _jsonl is None:
+                _jsonl = open(TELEMETRY_JSONL, "a", encoding="utf-8", buffering=1)
+            _jsonl.write(json.dumps({
+                "ts": sp.start,
+                "span": sp.name,
+                "ms": round(sp.duration * 1000, 3),
+                "cpu_ms": round(sp.cpu * 1000, 3),
+                **sp.attrs,
+            }, ensure_ascii=False, default=str) + "\n")
+
+    for fn in list(_listeners):
+        fn(sp)
+
+
+def start_span(name: str, **attrs) -> Span:
+    """Manual form, for stages that don't fit a with-block; call .end()."""
+    return Span(name, {**_turn_attrs.get(), **attrs})
+
+
+@contextmanager
+def span(name: str, **attrs):
+    sp = start_span(name, **attrs)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.set(error=type(e).__name__)
+        raise
+    finally:
+        sp.end()
+
+
+@contextmanager
+def turn_context(**attrs):
+    """Attributes (session id, turn number, language) inherited by every span opened inside."""
+    token = _turn_attrs.set({**_turn_attrs.get(), **attrs})
+    try:
+        yield
+    finally:
+        _turn_attrs.reset(token)
+
+
+def snapshot() -> dict:
+    """{span name: {count, sum_s, cpu_s}} summed over labels; handy for tests and benches."""
+    out = {}
+    with _lock:
+        for (name, _), h in _latency.items():
+            d = out.setdefault(name, {"count": 0, "sum_s": 0.0, "cpu_s": 0.0})
+            d["count"] += h.count
+            d["sum_s"] += h.sum
+        for (name, _), c in _cpu.items():
+            out[name]["cpu_s"] += c
+    return out
+
+
+def reset():
+    with _lock:
+        _latency.clear()
+        _cpu.clear()
+        _errors.clear()
+
+
+# ----------------------------
+# Prometheus text exposition
+# ----------------------------
+def _fmt_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, esc)) + "}"
+
+
+def render_prometheus() -> str:
+    lines = [
+        "# HELP voice_agent_span_seconds Wall time per pipeline stage.",
+        "# TYPE voice_agent_span_seconds histogram",
+    ]
+    with _lock:
+        latency = {k: (list(h.counts), h.sum, h.count) for k, h in _latency.items()}
+        cpu = dict(_cpu)
+        errors = dict(_errors)
+
+    for (name, labels), (counts, total, n) in sorted(latency.items()):
+        base = (("span", name),) + labels
+        acc = 0
+        for le, c in zip(BUCKETS, counts):
+            acc += c
+            lines.append(f"voice_agent_span_seconds_bucket{_fmt_labels(base + (('le', repr(le)),))} {acc}")
+        lines.append(f"voice_agent_span_seconds_bucket{_fmt_labels(base + (('le', '+Inf'),))} {n}")
+        lines.append(f"voice_agent_span_seconds_sum{_fmt_labels(base)} {total}")
+        lines.append(f"voice_agent_span_seconds_count{_fmt_labels(base)} {n}")
+
+    lines.append("# HELP voice_agent_span_cpu_seconds_total Thread CPU time per pipeline stage.")
+    lines.append("# TYPE voice_agent_span_cpu_seconds_total counter")
+    for (name, labels), c in sorted(cpu.items()):
+        lines.append(f"voice_agent_span_cpu_seconds_total{_fmt_labels((('span', name),) + labels)} {c}")
+
+    lines.append("# HELP voice_agent_span_errors_total Spans that ended with an exception.")
+    lines.append("# TYPE voice_agent_span_errors_total counter")
+    for (name, labels), c in sorted(errors.items()):
+        lines.append(f"voice_agent_span_errors_total{_fmt_labels((('span', name),) + labels)} {c}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # scraped every few seconds; keep stderr quiet
+
+
+def serve_metrics(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    """Start the /metrics endpoint in a daemon thread. Returns the server, or None if port is 0."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
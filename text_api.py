@@ -0,0 +1,208 @@
+import base64
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agent_core import process_turn, scheme_by_id, LANG_CODES
+from session_store import open_sessions
+from telemetry import span, turn_context, render_prometheus
+from profiling import profile_turn
+
+# Headless text channel (IVR / WhatsApp): same agent and session store as the UI,
+# no Gradio and no Whisper.
+#
+#   POST /v1/turn   {"session_id": "...", "text": "...", "lang": "hi", "tts": false, "audio_profile": "2g"}
+#   POST /v1/turns  {"turns": [<turn>, ...]}   -> {"results": [...]} in the same order
+#   GET  /metrics   Prometheus text (same spans as the UI)
+TEXT_API_HOST = os.getenv("TEXT_API_HOST", "0.0.0.0")
+TEXT_API_PORT = int(os.getenv("TEXT_API_PORT", "8081"))
+TEXT_API_WORKERS = int(os.getenv("TEXT_API_WORKERS", "16"))  # turns of one batch run in parallel
+TEXT_API_MAX_BATCH = int(os.getenv("TEXT_API_MAX_BATCH", "256"))
+TEXT_API_MAX_BODY = int(os.getenv("TEXT_API_MAX_BODY", str(1024 * 1024)))
+
+LANG_NAMES = {code: name for name, code in LANG_CODES.items()}
+
+SESSIONS = open_sessions(scheme_by_id)
+
+# one turn at a time per session, even if two requests race for it
+_session_locks = [threading.Lock() for _ in range(256)]
+
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+
+def _get_batch_pool():
+    global _batch_pool
+    if _batch_pool is None:
+        with _batch_pool_lock:
+            if _batch_pool is None:
+                _batch_pool = ThreadPoolExecutor(TEXT_API_WORKERS, thread_name_prefix="text-api")
+    return _batch_pool
+
+
+def _speak(text: str, lang: str, profile=None) -> dict:
+    from tts import tts_to_file  # loaded on first TTS request only
+
+    path = tts_to_file(text, lang, profile)  # "2g"/"3g": Opus/Ogg, "full": the backend's mp3/wav
+    with open(path, "rb") as f:
+        audio = f.read()
+    return {"audio_b64": base64.b64encode(audio).decode("ascii"), "audio_format": os.path.splitext(path)[1][1:]}
+
+
+def _invalid(turn):
+    """Why a decoded request body can't be a turn, or None."""
+    if not isinstance(turn, dict):
+        return "turn must be a JSON object"
+    for key in ("session_id", "text", "lang", "audio_profile"):
+        if turn.get(key) is not None and not isinstance(turn[key], str):
+            return f"{key} must be a string"
+    if turn.get("tts") is not None and not isinstance(turn["tts"], bool):
+        return "tts must be true or false"
+    return None
+
+
+def run_turn(turn: dict) -> dict:
+    """One text turn: load session -> process_turn -> save delta -> optional TTS."""
+    invalid = _invalid(turn)
+    if invalid:
+        return {"error": invalid}
+    text = (turn.get("text") or "").strip()
+    lang = turn.get("lang") or "hi"
+    if not text:
+        return {"error": "text is required"}
+    if lang not in LANG_NAMES:
+        return {"error": f"unsupported lang: {lang}"}
+
+    session_id = turn.get("session_id") or SESSIONS.new_id()
+    lock = _session_locks[hash(session_id) % len(_session_locks)]
+    with lock:
+        memory, history, rec = SESSIONS.load(session_id)
+        turn_no = len(history) + 1
+        with turn_context(session=session_id, turn=turn_no, lang=lang, channel="api"), \
+                profile_turn(session_id, turn_no) as prof, span("turn"):
+            reply, memory = process_turn(text, LANG_NAMES[lang], memory)
+            if prof:
+                prof.set(trace=memory.get("last_trace", ""))
+            history = history + [(text, reply)]
+            SESSIONS.save(session_id, memory, history, rec)
+
+    out = {
+        "session_id": session_id,
+        "reply": reply,
+        "stage": memory.get("stage"),
+        "trace": memory.get("last_trace", ""),
+    }
+    if turn.get("tts"):
+        try:
+            out.update(_speak(reply, lang, turn.get("audio_profile")))
+        except Exception as e:
+            out["tts_error"] = type(e).__name__
+    return out
+
+
+def run_batch(turns) -> list:
+    """
+    Turns for different sessions run in parallel; turns for the same session
+    keep their order within the batch.
+    """
+    results = [None] * len(turns)
+    by_session = {}
+    for i, t in enumerate(turns):
+        invalid = _invalid(t)
+        if invalid:
+            results[i] = {"error": invalid}
+            continue
+        sid = t.get("session_id") or f"\0new-{i}"  # turns without an id each start their own session
+        by_session.setdefault(sid, []).append(i)
+
+    def run_chain(idxs):
+        for i in idxs:
+            try:
+                results[i] = run_turn(turns[i])
+            except Exception as e:
+                results[i] = {"error": type(e).__name__}
+
+    list(_get_batch_pool().map(run_chain, by_session.values()))
+    return results
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: channel gateways reuse one connection
+
+    def _send(self, code: int, payload, content_type="application/json; charset=utf-8"):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        if n < 0:
+            raise ValueError("bad Content-Length")
+        if n > TEXT_API_MAX_BODY:
+            raise ValueError("body too large")
+        return json.loads(self.rfile.read(n) or b"{}")
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            self._send(200, render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        elif path == "/healthz":
+            self._send(200, {"ok": True, "sessions": SESSIONS.stats()})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        try:
+            req = self._body()
+        except (ValueError, json.JSONDecodeError) as e:
+            self.close_connection = True  # body may be partially unread
+            self._send(400, {"error": str(e)})
+            return
+
+        if path in ("/v1/turn", "/v1/turns") and not isinstance(req, dict):
+            self._send(400, {"error": "body must be a JSON object"})
+            return
+
+        if path == "/v1/turn":
+            try:
+                out = run_turn(req)
+            except Exception as e:
+                # Ollama / session store / TTS failure: answer instead of dropping the connection
+                self._send(500, {"error": type(e).__name__})
+                return
+            self._send(400 if "error" in out and "session_id" not in out else 200, out)
+        elif path == "/v1/turns":
+            turns = req.get("turns")
+            if not isinstance(turns, list) or len(turns) > TEXT_API_MAX_BATCH:
+                self._send(400, {"error": f"turns must be a list of at most {TEXT_API_MAX_BATCH}"})
+                return
+            self._send(200, {"results": run_batch(turns)})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(host: str = TEXT_API_HOST, port: int = TEXT_API_PORT, sock=None):
+    """sock: an already-listening socket, e.g. inherited from prefork.py; host/port are then ignored."""
+    if sock is None:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    else:
+        host, port = sock.getsockname()[:2]
+        server = ThreadingHTTPServer((host, port), _Handler, bind_and_activate=False)
+        server.socket = sock
+        server.server_name, server.server_port = host, port
+    server.daemon_threads = True
+    print(f"text API on http://{host}:{port}/v1/turn")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve()
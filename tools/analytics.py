@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import time
+from datetime import date, datetime
+from pathlib import Path
+import numpy as np
+
+from tools.application_store import STORE_PATH
+
+SNAPSHOT_PATH = Path(os.getenv("ANALYTICS_SNAPSHOT", "data/analytics/applications.npz"))
+
+# dictionary-encoded string columns (code 0 = missing)
+DIM_COLUMNS = ("scheme_id", "state", "category", "gender", "is_student", "status")
+# numeric profile columns (NaN = missing): filtered by value or inclusive (lo, hi) range
+RANGE_COLUMNS = ("age", "annual_income")
+_EPOCH = date(1970, 1, 1)
+
+
+def _dim_value(rec: dict, col: str):
+    v = rec.get(col) if col in ("scheme_id", "status") else (rec.get("profile") or {}).get(col)
+    if v is None or v == "":
+        return None
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    return str(v)
+
+
+def _day(ts: str) -> int:
+    try:
+        return (datetime.fromisoformat(ts).date() - _EPOCH).days
+    except (TypeError, ValueError):
+        return -1
+
+
+class Snapshot:
+    """
+    Columnar copy of the application log: one row per tracking_id (latest status),
+    string columns as int32 codes into per-column dictionaries, plus created day,
+    age and income (range filters). refresh() only parses lines appended since the last call;
+    a compaction (segment files replaced) triggers a rebuild.
+    """
+
+    def __init__(self, store_path: Path = STORE_PATH, snapshot_path: Path = SNAPSHOT_PATH):
+        self.store_path = Path(store_path)
+        self.snapshot_path = Path(snapshot_path)
+        self._clear()
+
+    def _clear(self):
+        self.n = 0
+        self.dicts = {c: [None] for c in DIM_COLUMNS}   # code -> string
+        self._codes = {c: {} for c in DIM_COLUMNS}      # string -> code
+        self.cols = {c: np.zeros(1024, dtype=np.int32) for c in DIM_COLUMNS}
+        self.cols["day"] = np.full(1024, -1, dtype=np.int32)
+        self.cols["age"] = np.full(1024, np.nan, dtype=np.float32)
+        self.cols["annual_income"] = np.full(1024, np.nan, dtype=np.float64)
+        self.rows = {}      # tracking_id -> row
+        self.pos = (0, 0)   # (segment, offset) parsed so far
+        self.inodes = {}    # segment -> inode seen when it was parsed
+
+    # ----------------------------
+    # Segments (same layout as tools.application_store)
+    # ----------------------------
+    def _segment_path(self, seg: int) -> Path:
+        if seg == 0:
+            return self.store_path
+        return self.store_path.with_name(f"{self.store_path.stem}.{seg:06d}{self.store_path.suffix}")
+
+    def _segments(self) -> list:
+        segs = [0] if self.store_path.exists() else []
+        for p in self.store_path.parent.glob(f"{self.store_path.stem}.*{self.store_path.suffix}"):
+            num = p.name[len(self.store_path.stem) + 1:-len(self.store_path.suffix)]
+            if num.isdigit():
+                segs.append(int(num))
+        return sorted(segs)
+
+    def _compacted(self, segs) -> bool:
+        for seg, ino in self.inodes.items():
+            try:
+                if os.stat(self._segment_path(seg)).st_ino != ino:
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    # ----------------------------
+    # Ingest
+    # ----------------------------
+    def _code(self, col: str, v):
+        if v is None:
+            return 0
+        c = self._codes[col].get(v)
+        if c is None:
+            c = self._codes[col][v] = len(self.dicts[col])
+            self.dicts[col].append(v)
+        return c
+
+    def _grow(self):
+        for k, a in self.cols.items():
+            fill = -1 if k == "day" else (np.nan if a.dtype.kind == "f" else 0)
+            b = np.full(len(a) * 2, fill, dtype=a.dtype)
+            b[:len(a)] = a
+            self.cols[k] = b
+
+    def _ingest(self, rec: dict):
+        tid = rec.get("tracking_id")
+        if not tid:
+            return
+        row = self.rows.get(tid)
+        if row is None:
+            if self.n == len(self.cols["day"]):
+                self._grow()
+            row = self.rows[tid] = self.n
+            self.n += 1
+            self.cols["day"][row] = _day(rec.get("created_at"))
+        for c in DIM_COLUMNS:
+            self.cols[c][row] = self._code(c, _dim_value(rec, c))
+        prof = rec.get("profile") or {}
+        for c in ("age", "annual_income"):
+            v = prof.get(c)
+            self.cols[c][row] = float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+
+    def refresh(self) -> int:
+        """Parse what was appended since last time. Returns the number of new lines."""
+        segs = self._segments()
+        if self._compacted(segs):
+            self._clear()
+        start_seg, start_off = self.pos
+        added = 0
+        for seg in segs:
+            if seg < start_seg:
+                continue
+            path = self._segment_path(seg)
+            off = start_off if seg == start_seg else 0
+            with open(path, "rb") as f:
+                self.inodes[seg] = os.fstat(f.fileno()).st_ino
+                f.seek(off)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # being written right now
+                    off += len(line)
+                    try:
+                        self._ingest(json.loads(line))
+                        added += 1
+                    except ValueError:
+                        continue
+            self.pos = (seg, off)
+        return added
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def save(self):
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "n": self.n,
+            "dicts": self.dicts,
+            "rows": self.rows,
+            "pos": list(self.pos),
+            "inodes": {str(k): v for k, v in self.inodes.items()},
+        }
+        tmp = self.snapshot_path.with_suffix(".tmp.npz")
+        np.savez(tmp, meta=np.array(json.dumps(meta, ensure_ascii=False)),
+                 **{k: a[:self.n] for k, a in self.cols.items()})
+        os.replace(tmp, self.snapshot_path)
+
+    @classmethod
+    def open(cls, store_path: Path = STORE_PATH, snapshot_path: Path = SNAPSHOT_PATH) -> "Snapshot":
+        """Load the persisted snapshot (if any) and catch up with the log."""
+        snap = cls(store_path, snapshot_path)
+        if snap.snapshot_path.exists():
+            with np.load(snap.snapshot_path) as z:
+                meta = json.loads(str(z["meta"]))
+                snap.n = meta["n"]
+                snap.dicts = meta["dicts"]
+                snap._codes = {c: {v: i for i, v in enumerate(d) if i} for c, d in snap.dicts.items()}
+                snap.rows = meta["rows"]
+                snap.pos = tuple(meta["pos"])
+                snap.inodes = {int(k): v for k, v in meta["inodes"].items()}
+                cap = max(1024, snap.n)
+                for k in snap.cols:
+                    a = z[k]
+                    fill = -1 if k == "day" else (np.nan if a.dtype.kind == "f" else 0)
+                    b = np.full(cap, fill, dtype=a.dtype)
+                    b[:len(a)] = a
+                    snap.cols[k] = b
+        snap.refresh()
+        return snap
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def _mask(self, where=None, since=None, until=None):
+        m = np.ones(self.n, dtype=bool)
+        for col, want in (where or {}).items():
+            if col in RANGE_COLUMNS:
+                m &= self._range_mask(col, want)
+                continue
+            if col not in DIM_COLUMNS:
+                raise ValueError(f"unknown column {col}" + (" (use since/until)" if col == "day" else ""))
+            vals = want if isinstance(want, (list, tuple, set)) else [want]
+            codes = [self._codes[col].get(str(v).lower() if isinstance(v, bool) else str(v)) for v in vals]
+            codes = [c for c in codes if c is not None]
+            m &= np.isin(self.cols[col][:self.n], codes)
+        day = self.cols["day"][:self.n]
+        if since is not None:
+            m &= day >= (date.fromisoformat(str(since)) - _EPOCH).days
+        if until is not None:
+            m &= day <= (date.fromisoformat(str(until)) - _EPOCH).days
+        return m
+
+    def _range_mask(self, col: str, want):
+        """want: a number, or (lo, hi) with None for an open end; missing values never match."""
+        a = self.cols[col][:self.n]
+        lo, hi = want if isinstance(want, (list, tuple)) else (want, want)
+        m = ~np.isnan(a)
+        if lo is not None:
+            m &= a >= float(lo)
+        if hi is not None:
+            m &= a <= float(hi)
+        return m
+
+    def count(self, where=None, since=None, until=None) -> int:
+        return int(self._mask(where, since, until).sum())
+
+    def group_count(self, by, where=None, since=None, until=None) -> dict:
+        """
+        {(value, ...): count} grouped by one or more of DIM_COLUMNS and "day".
+        where: {column: value or [values]}, or for RANGE_COLUMNS a number or
+        (lo, hi); since/until: ISO dates (inclusive).
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        for col in by:
+            if col not in DIM_COLUMNS and col != "day":
+                raise ValueError(f"unknown column {col}")
+        m = self._mask(where, since, until)
+        keys = [self.cols[c][:self.n][m].astype(np.int64) for c in by]
+        if not keys:
+            return {(): int(m.sum())}
+        if "day" in by:
+            i = by.index("day")
+            keys[i] = keys[i] + 1  # -1 (unknown) -> 0
+        combined = np.zeros(len(keys[0]), dtype=np.int64)
+        sizes = []
+        for k in keys:
+            size = int(k.max()) + 1 if len(k) else 1
+            combined = combined * size + k
+            sizes.append(size)
+        uniq, counts = np.unique(combined, return_counts=True)
+
+        out = {}
+        for u, c in zip(uniq.tolist(), counts.tolist()):
+            parts = []
+            for col, size in zip(reversed(by), reversed(sizes)):
+                code = u % size
+                u //= size
+                if col == "day":
+                    parts.append((_EPOCH.fromordinal(_EPOCH.toordinal() + code - 1)).isoformat() if code else None)
+                else:
+                    parts.append(self.dicts[col][code])
+            out[tuple(reversed(parts))] = c
+        return out
+
+
+def parse_where(items) -> dict:
+    """["state=Bihar", "age=18..30", "annual_income=..250000"] -> where dict for group_count."""
+    where = {}
+    for item in items:
+        col, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"expected column=value, got {item!r}")
+        if col in RANGE_COLUMNS:
+            lo, dots, hi = value.partition("..")
+            try:
+                where[col] = (float(lo) if lo else None, float(hi) if hi else None) if dots else float(value)
+            except ValueError:
+                raise ValueError(f"{col} needs a number or lo..hi, got {value!r}") from None
+        else:
+            where[col] = value
+    return where
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Counts over submitted applications")
+    ap.add_argument("--by", nargs="*", default=["scheme_id"], help=f"group by: {', '.join(DIM_COLUMNS)}, day")
+    ap.add_argument("--where", nargs="*", default=[],
+                    help=f"column=value filters; {', '.join(RANGE_COLUMNS)} also take lo..hi (either end optional)")
+    ap.add_argument("--since")
+    ap.add_argument("--until")
+    ap.add_argument("--follow", type=float, default=0, help="keep tailing the log every N seconds")
+    args = ap.parse_args()
+
+    try:
+        where = parse_where(args.where)
+    except ValueError as e:
+        ap.error(str(e))
+    snap = Snapshot.open()
+    while True:
+        t0 = time.perf_counter()
+        try:
+            rows = snap.group_count(args.by, where, args.since, args.until)
+        except ValueError as e:  # unknown column, bad date
+            ap.error(str(e))
+        ms = (time.perf_counter() - t0) * 1000
+        for k, c in sorted(rows.items(), key=lambda kv: -kv[1]):
+            print(c, *k, sep="\t")
+        print(f"# {snap.n} applications, query {ms:.2f} ms")
+        snap.save()
+        if not args.follow:
+            break
+        time.sleep(args.follow)
+        snap.refresh()
+
+
+if __name__ == "__main__":
+    main()
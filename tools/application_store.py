@@ -1,25 +1,546 @@
+import hashlib
 import json
+import os
+import tempfile
+import threading
+import time
 from pathlib import Path
 from uuid import uuid4
 from datetime import datetime, timezone
+from telemetry import span
 
-STORE_PATH = Path("data/applications.jsonl")
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STORE_PATH = Path(os.getenv("APP_STORE_PATH", "data/applications.jsonl"))  # segment 0; later: applications.000001.jsonl, ...
+INDEX_PATH = STORE_PATH.with_suffix(".idx")   # "<tracking_id> <segment> <offset> <length> <dedupe key>" per record
+LOCK_PATH = STORE_PATH.with_suffix(".lock")
+
+# batch -> one fsync per group commit (a submission returns only once it is on disk)
+# off   -> leave flushing to the OS (faster, may lose the last writes on power loss)
+APP_STORE_FSYNC = os.getenv("APP_STORE_FSYNC", "batch")
+
+# rotation: a new segment once the active one is this big / this old (0 = off)
+APP_STORE_SEGMENT_MB = float(os.getenv("APP_STORE_SEGMENT_MB", "64"))
+APP_STORE_SEGMENT_HOURS = float(os.getenv("APP_STORE_SEGMENT_HOURS", "24"))
+# compaction: fold sealed segments into one, latest version per tracking_id
+# (segment 0, the original applications.jsonl, is never rewritten)
+APP_STORE_COMPACT_EVERY_S = float(os.getenv("APP_STORE_COMPACT_EVERY_S", "600"))  # 0 = no background thread
+APP_STORE_COMPACT_MIN_SEGMENTS = int(os.getenv("APP_STORE_COMPACT_MIN_SEGMENTS", "2"))
+
+# a new submission for the same (profile, scheme) is allowed again once the old one ended like this
+REOPEN_STATUSES = {"rejected", "withdrawn", "cancelled"}
+
+
+def dedupe_key(profile: dict, scheme_id: str) -> str:
+    """Same applicant answers + same scheme -> same key (field order, case and blanks don't matter)."""
+    canon = {}
+    for k, v in (profile or {}).items():
+        if v is None or v == "":
+            continue
+        canon[k] = v.strip().lower() if isinstance(v, str) else v
+    raw = json.dumps([canon, scheme_id], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+class _FileLock:
+    """Exclusive lock across processes (flock on POSIX, msvcrt on Windows)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._f = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        else:
+            self._f.seek(0)
+            msvcrt.locking(self._f.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+            else:
+                self._f.seek(0)
+                msvcrt.locking(self._f.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._f.close()
+
+
+class ApplicationStore:
+    """
+    Segmented append-only JSONL log + tracking_id -> (segment, offset, length) index.
+
+    - Every version of a record is a full line; update_status appends a new
+      line and the index points at the latest one.
+    - The active (highest) segment rotates by size/age; sealed segments are
+      never written again, so compaction can copy them without the lock and
+      only swaps files + index under it.
+    - The index file is only a cache of the log: on open (and when another
+      process has written) it is read from where we left off, and any log
+      lines it misses (crash between the two appends) are re-indexed. If it
+      was rewritten by a compaction, it is reloaded from scratch; if it still
+      points at pre-compaction offsets (crash mid-compaction), it is rebuilt
+      from a full scan of the log.
+    - Concurrent save() calls are group-committed: one thread writes and
+      fsyncs the whole pending batch while the others wait for it.
+    - (profile, scheme_id) is hashed; resubmitting the same application
+      returns the existing tracking id instead of writing a duplicate.
+    """
+
+    def __init__(self, path: Path = STORE_PATH, index_path: Path = INDEX_PATH,
+                 lock_path: Path = LOCK_PATH, fsync: str = APP_STORE_FSYNC):
+        self.path = Path(path)
+        self.index_path = Path(index_path)
+        self.fsync = fsync
+        self.segment_bytes = int(APP_STORE_SEGMENT_MB * 1024 * 1024)
+        self.segment_seconds = APP_STORE_SEGMENT_HOURS * 3600
+        self._lock = _FileLock(Path(lock_path))
+        # one compaction at a time across processes (held for the whole copy + swap; writers don't take it)
+        self._compact_lock = _FileLock(Path(lock_path).with_suffix(".compact.lock"))
+
+        self._mu = threading.RLock()  # guards everything below
+        self._reset_index()
+        self._active_seg = None   # segment _active_since belongs to
+        self._active_since = None
+
+        self._cond = threading.Condition()
+        self._pending = []   # [record, is_new, result] waiting for a leader
+        self._leader = False
+        self.commits = 0
+        self.records = 0
+        self.duplicates = 0
+        self.compactions = 0
+        self._compactor = None
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if self._legacy_index():
+                self.index_path.unlink()  # no segment/dedupe columns: rebuild from the log
+            self._catch_up(write_missing=True)
+            segs = self._segments()
+            if segs:
+                self._active_seg, self._active_since = segs[-1], self._segment_started(segs[-1])
+
+    # ----------------------------
+    # Segments
+    # ----------------------------
+    def _segment_path(self, seg: int) -> Path:
+        if seg == 0:
+            return self.path
+        return self.path.with_name(f"{self.path.stem}.{seg:06d}{self.path.suffix}")
+
+    def _segments(self) -> list:
+        segs = [0] if self.path.exists() else []
+        for p in self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}"):
+            num = p.name[len(self.path.stem) + 1:-len(self.path.suffix)]
+            if num.isdigit():
+                segs.append(int(num))
+        return sorted(segs)
+
+    def _segment_started(self, seg: int) -> float:
+        """Time of the segment's first record (rotation age survives restarts); now if it has none."""
+        try:
+            with open(self._segment_path(seg), "rb") as f:
+                rec = json.loads(f.readline())
+            return datetime.fromisoformat(rec.get("updated_at") or rec["created_at"]).timestamp()
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return time.time()
+
+    # ----------------------------
+    # Index
+    # ----------------------------
+    def _reset_index(self):
+        self._index = {}      # tracking_id -> (segment, offset, length)
+        self._dedupe = {}     # dedupe key -> tracking_id
+        self._idx_pos = 0     # bytes of the index file already read
+        self._idx_ino = None  # changes when a compaction rewrites the index ...
+        self._idx_gen = None  # ... and so does this header line (inode numbers get reused)
+        self._log_pos = (0, 0)  # (segment, offset) covered by the index
+
+    def _legacy_index(self) -> bool:
+        try:
+            with open(self.index_path, "rb") as f:
+                first = f.readline()
+        except FileNotFoundError:
+            return False
+        return len(first.split()) == 3
+
+    def _add(self, tid, seg, off, n, dkey):
+        self._index[tid] = (seg, off, n)
+        if dkey:
+            self._dedupe[dkey] = tid
+        self._log_pos = max(self._log_pos, (seg, off + n))
+
+    def _catch_up(self, write_missing: bool = False):
+        """Pick up index lines and log lines appended since we last looked."""
+        with self._mu:
+            try:
+                with open(self.index_path, "rb") as f:
+                    st = os.fstat(f.fileno())
+                    first = f.readline()
+                    gen = first if first.startswith(b"#") else b""
+                    if (self._idx_ino is not None and (st.st_ino != self._idx_ino or st.st_size < self._idx_pos)) \
+                            or (self._idx_gen is not None and gen != self._idx_gen):
+                        self._reset_index()
+                    self._idx_ino, self._idx_gen = st.st_ino, gen
+                    f.seek(self._idx_pos)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break  # being written right now
+                        self._idx_pos += len(line)
+                        parts = line.decode("ascii", "replace").split()
+                        if len(parts) < 4:
+                            continue  # damaged line; the log scan below re-indexes what it pointed at
+                        tid, seg, off, n, dkey = (parts + [""])[:5]
+                        try:
+                            self._add(tid, int(seg), int(off), int(n), dkey)
+                        except ValueError:
+                            continue
+            except FileNotFoundError:
+                pass
+
+            missing = self._scan_log()
+            if missing and write_missing:
+                data = "".join(missing).encode("ascii")
+                with open(self.index_path, "ab") as f:
+                    f.write(data)
+                if self._idx_ino is None:
+                    self._idx_ino = os.stat(self.index_path).st_ino
+                self._idx_pos += len(data)
+
+    def _scan_log(self) -> list:
+        """Index log lines past _log_pos; returns them as index lines."""
+        with self._mu:
+            missing = []
+            start_seg, start_off = self._log_pos
+            for seg in self._segments():
+                if seg < start_seg:
+                    continue
+                off = start_off if seg == start_seg else 0
+                try:
+                    f = open(self._segment_path(seg), "rb")
+                except FileNotFoundError:
+                    continue  # folded into a later segment by a compaction in another process
+                with f:
+                    f.seek(off)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        try:
+                            rec = json.loads(line)
+                            tid = rec["tracking_id"]
+                            dkey = dedupe_key(rec.get("profile"), rec.get("scheme_id"))
+                        except (ValueError, KeyError):
+                            tid = None  # corrupt line; skip it but keep offsets right
+                        if tid:
+                            self._add(tid, seg, off, len(line), dkey)
+                            missing.append(f"{tid} {seg} {off} {len(line)} {dkey}\n")
+                        off += len(line)
+                self._log_pos = max(self._log_pos, (seg, off))
+            return missing
+
+    def _write_index(self):
+        """Replace the index file with the in-memory index (lock held)."""
+        dkeys = {tid: d for d, tid in self._dedupe.items()}
+        fd, idx_tmp = tempfile.mkstemp(dir=self.index_path.parent, prefix=self.index_path.name + ".", suffix=".tmp")
+        header = f"# {uuid4().hex}\n".encode("ascii")
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            for tid, (s, o, n) in sorted(self._index.items(), key=lambda kv: kv[1]):
+                f.write(f"{tid} {s} {o} {n} {dkeys.get(tid, '')}\n".encode("ascii"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(idx_tmp, self.index_path)
+        st = os.stat(self.index_path)
+        self._idx_ino, self._idx_pos, self._idx_gen = st.st_ino, st.st_size, header
+
+    def _rebuild_index(self):
+        """
+        Index from a full scan of the log. For an index that points at a segment's
+        pre-compaction offsets (crash between the segment swap and the index swap).
+        """
+        with span("store.reindex"), self._lock, self._mu:
+            self._reset_index()
+            self._scan_log()
+            self._write_index()
+
+    def _read(self, tracking_id: str):
+        with self._mu:
+            loc = self._index.get(tracking_id)
+        if loc is None:
+            return None
+        seg, off, n = loc
+        with open(self._segment_path(seg), "rb") as f:
+            f.seek(off)
+            rec = json.loads(f.read(n))
+        if rec.get("tracking_id") != tracking_id:
+            raise ValueError("stale index entry")  # file was compacted under us
+        return rec
+
+    # ----------------------------
+    # Group commit
+    # ----------------------------
+    def _append(self, record: dict, is_new: bool) -> str:
+        item = [record, is_new, None]
+        with self._cond:
+            self._pending.append(item)
+            while item[2] is None and self._leader:
+                self._cond.wait()
+            if item[2] is None:
+                # nobody is writing: this thread leads and takes everything queued so far
+                self._leader = True
+                batch, self._pending = self._pending, []
+            else:
+                batch = None
+
+        if batch is not None:
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                for it in batch:
+                    it[2] = e
+            finally:
+                with self._cond:
+                    self._leader = False
+                    self._cond.notify_all()
+
+        if isinstance(item[2], Exception):
+            raise item[2]
+        return item[2]
+
+    def _existing(self, dkey: str):
+        """Tracking id of a still-open application with this dedupe key, or None."""
+        tid = self._dedupe.get(dkey)
+        if tid is None:
+            return None
+        try:
+            rec = self._read(tid)
+        except (OSError, ValueError):
+            return None
+        if rec is None or rec.get("status") in REOPEN_STATUSES:
+            return None
+        return tid
+
+    def _write_batch(self, batch):
+        with span("store.write", records=len(batch)) as sp, self._lock, self._mu:
+            self._catch_up()  # other processes may have appended
+            segs = self._segments()
+            seg = segs[-1] if segs else 0
+            path = self._segment_path(seg)
+            size = path.stat().st_size if path.exists() else 0
+            if seg != self._active_seg:  # first write, or another process rotated
+                self._active_seg, self._active_since = seg, self._segment_started(seg)
+            if size and (
+                (self.segment_bytes and size >= self.segment_bytes)
+                or (self.segment_seconds and time.time() - self._active_since >= self.segment_seconds)
+            ):
+                seg += 1
+                path = self._segment_path(seg)
+                self._active_seg, self._active_since = seg, time.time()
+
+            lines, entries, seen = [], [], {}
+            off = size if path.exists() else 0
+            for it in batch:
+                rec, is_new, _ = it
+                dkey = dedupe_key(rec.get("profile"), rec.get("scheme_id"))
+                if is_new:
+                    dup = seen.get(dkey) or self._existing(dkey)
+                    if dup:
+                        it[2] = dup
+                        self.duplicates += 1
+                        continue
+                    seen[dkey] = rec["tracking_id"]
+                line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+                lines.append(line)
+                entries.append((rec["tracking_id"], seg, off, len(line), dkey))
+                it[2] = rec["tracking_id"]
+                off += len(line)
+            sp.set(written=len(lines))
+            if not lines:
+                return
+
+            with open(path, "ab") as f:
+                f.write(b"".join(lines))
+                f.flush()
+                if self.fsync == "batch":
+                    os.fsync(f.fileno())
+
+            data = "".join(f"{t} {s} {o} {n} {d}\n" for t, s, o, n, d in entries).encode("ascii")
+            with open(self.index_path, "ab") as f:
+                f.write(data)
+            if self._idx_ino is None:
+                self._idx_ino = os.stat(self.index_path).st_ino
+            self._idx_pos += len(data)
+
+            for e in entries:
+                self._add(*e)
+            self.commits += 1
+            self.records += len(lines)
+
+    # ----------------------------
+    # Compaction
+    # ----------------------------
+    def compact(self, force: bool = False) -> int:
+        """
+        Rewrite all sealed segments (except segment 0) as one, keeping only the
+        latest version of each application that lives there. Returns the number
+        of lines dropped.
+        """
+        with self._compact_lock:
+            for stale in self.path.parent.glob(f"{self.path.stem}*.compact.tmp"):
+                stale.unlink(missing_ok=True)  # left by a compaction that crashed; none can be running now
+            return self._compact(force)
+
+    def _compact(self, force: bool) -> int:
+        with self._lock:
+            self._catch_up()
+            segs = self._segments()
+        sealed = [s for s in segs[:-1] if s != 0]
+        if not sealed or (len(sealed) < APP_STORE_COMPACT_MIN_SEGMENTS and not force):
+            return 0
+
+        with span("store.compact", segments=len(sealed)):
+            # sealed segments are immutable: copy without holding the store lock (writers keep going)
+            with self._mu:
+                live = sorted((loc, tid) for tid, loc in self._index.items() if loc[0] in sealed)
+            target = sealed[-1]
+            target_path = self._segment_path(target)
+            fd, tmp = tempfile.mkstemp(dir=target_path.parent, prefix=target_path.name + ".", suffix=".compact.tmp")
+            moved = {}
+            lines_before = 0
+            for s in sealed:
+                with open(self._segment_path(s), "rb") as f:
+                    lines_before += sum(1 for _ in f)
+            with os.fdopen(fd, "wb") as out:
+                off = 0
+                for (s, o, n), tid in live:
+                    with open(self._segment_path(s), "rb") as f:
+                        f.seek(o)
+                        line = f.read(n)
+                    out.write(line)
+                    moved[tid] = ((s, o, n), (target, off, n))
+                    off += n
+                out.flush()
+                os.fsync(out.fileno())
+
+            # swap files + index under the lock
+            with self._lock, self._mu:
+                self._catch_up()
+                os.replace(tmp, target_path)
+                for tid, (old, new) in moved.items():
+                    if self._index.get(tid) == old:  # not updated meanwhile
+                        self._index[tid] = new
+
+                # a crash before this line leaves old offsets in the index; get() then rescans the log
+                self._write_index()
+
+                for s in sealed[:-1]:
+                    try:
+                        self._segment_path(s).unlink()
+                    except OSError:
+                        pass  # still open elsewhere (Windows); the next compaction retries
+            self.compactions += 1
+        return lines_before - len(live)
+
+    def _compact_loop(self, every: float):
+        while True:
+            time.sleep(every)
+            try:
+                self.compact()
+            except Exception:
+                continue  # try again next round
+
+    def start_compactor(self, every: float = APP_STORE_COMPACT_EVERY_S):
+        if every > 0 and self._compactor is None:
+            self._compactor = threading.Thread(target=self._compact_loop, args=(every,),
+                                               name="app-store-compactor", daemon=True)
+            self._compactor.start()
+        return self
+
+    # ----------------------------
+    # API
+    # ----------------------------
+    def save(self, profile: dict, scheme: dict) -> str:
+        """Tracking id of the new application, or of the open one with the same profile + scheme."""
+        return self._append({
+            "tracking_id": uuid4().hex[:10].upper(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "scheme_id": scheme.get("scheme_id"),
+            "scheme_name_hi": scheme.get("name_hi"),
+            "profile": profile,
+            "status": "submitted"
+        }, is_new=True)
+
+    def get(self, tracking_id: str):
+        """Latest version of the application, or None."""
+        for attempt in range(3):
+            try:
+                rec = self._read(tracking_id)
+            except (OSError, ValueError):
+                rec = None
+                if attempt == 0:
+                    with self._mu:
+                        self._reset_index()  # compacted under us: reload from the new index
+                else:
+                    self._rebuild_index()  # the index file itself is stale: rescan the log
+            if rec is not None:
+                return rec
+            self._catch_up()  # maybe written by another worker process
+        return None
+
+    def update_status(self, tracking_id: str, status: str):
+        """Appends the record with the new status; returns it, or None if unknown."""
+        rec = self.get(tracking_id)
+        if rec is None:
+            return None
+        rec["status"] = status
+        rec["updated_at"] = datetime.now(timezone.utc).isoformat()
+        self._append(rec, is_new=False)
+        return rec
+
+    def stats(self) -> dict:
+        with self._mu:
+            n = len(self._index)
+        return {
+            "applications": n,
+            "segments": len(self._segments()),
+            "records": self.records,
+            "commits": self.commits,
+            "duplicates": self.duplicates,
+            "compactions": self.compactions,
+            "fsync": self.fsync,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> ApplicationStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                # APP_STORE_COMPACT_EVERY_S read now: prefork turns it off in all workers but one
+                _store = ApplicationStore().start_compactor(APP_STORE_COMPACT_EVERY_S)
+    return _store
 
 def save_application(profile: dict, scheme: dict):
     """
     scheme must include: scheme_id, name_hi
-    Returns: tracking_id
+    Returns: tracking_id (the existing one if this exact application is already open)
     """
-    tracking_id = uuid4().hex[:10].upper()
-    record = {
-        "tracking_id": tracking_id,
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "scheme_id": scheme.get("scheme_id"),
-        "scheme_name_hi": scheme.get("name_hi"),
-        "profile": profile,
-        "status": "submitted"
-    }
-    STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(STORE_PATH, "a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
-    return tracking_id
+    return get_store().save(profile, scheme)
+
+def get_application(tracking_id: str):
+    return get_store().get(tracking_id)
+
+def update_status(tracking_id: str, status: str):
+    return get_store().update_status(tracking_id, status)
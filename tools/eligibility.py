@@ -1,11 +1,49 @@
+import bisect
 import json
+import threading
 from pathlib import Path
 
 RULES_PATH = Path("data/rules.json")
 
+_rules = None
+_rules_mtime = None
+_rules_version = 0
+_rule_fields = None
+_compiled = {}  # scheme_id -> (required_fields, [_CompiledRule, ...]), rebuilt with the rules
+_index = None   # RuleIndex over the same rules, built on first use
+_rules_lock = threading.Lock()
+
 def load_rules():
-    with open(RULES_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Parsed rules; the file is re-read only when its mtime changes."""
+    global _rules, _rules_mtime, _rules_version, _rule_fields, _compiled, _index
+    mtime = RULES_PATH.stat().st_mtime_ns
+    with _rules_lock:
+        if _rules is None or mtime != _rules_mtime:
+            with open(RULES_PATH, "r", encoding="utf-8") as f:
+                _rules = json.load(f)
+            _rules_mtime = mtime
+            _rules_version += 1
+            _rule_fields = None
+            _compiled = _compile(_rules)
+            _index = None
+        return _rules
+
+def rules_version() -> int:
+    """Bumped every time the rules file is (re)loaded."""
+    load_rules()
+    return _rules_version
+
+def rule_fields() -> tuple:
+    """Every profile field any scheme's rules or required_fields look at."""
+    global _rule_fields
+    rules_db = load_rules()
+    if _rule_fields is None:
+        fields = set()
+        for scheme_rules in rules_db.values():
+            fields.update(scheme_rules.get("required_fields", []))
+            fields.update(r.get("field") for r in scheme_rules.get("rules", []))
+        _rule_fields = tuple(sorted(f for f in fields if f))
+    return _rule_fields
 
 def _compare(op, a, b):
     if a is None:
@@ -117,6 +155,46 @@ def _field_hi(field: str) -> str:
 
 
 
+class _CompiledRule:
+    """One rule with its explanations formatted once, at load."""
+    __slots__ = ("field", "op", "value", "pass_hi", "fail_hi", "fail_prefix", "fail_suffix", "missing_hi", "unclear_hi")
+
+    def __init__(self, r: dict):
+        field, op, val = r.get("field"), r.get("op"), r.get("value")
+        label = _field_hi(field)
+        self.field, self.op, self.value = field, op, val
+        self.pass_hi = r.get("pass_hi") or f"✅ शर्त पूरी: {label} ठीक है।"
+        self.fail_hi = r.get("fail_hi")
+        # only the user's value changes between calls: "... {label} (<value>) {op} {val} ..."
+        self.fail_prefix = f"❌ शर्त पूरी नहीं: {label} ("
+        self.fail_suffix = f") {op} {val} होना चाहिए।"
+        self.missing_hi = f"⚠️ {label} की जानकारी चाहिए।"
+        self.unclear_hi = f"⚠️ {label} की जानकारी/फॉर्मेट स्पष्ट नहीं है।"
+
+    def fail_text(self, user_value) -> str:
+        return self.fail_hi or f"{self.fail_prefix}{user_value}{self.fail_suffix}"
+
+
+def _compile(rules_db: dict) -> dict:
+    return {
+        scheme_id: (
+            tuple(scheme_rules.get("required_fields", [])),
+            [_CompiledRule(r) for r in scheme_rules.get("rules", [])],
+        )
+        for scheme_id, scheme_rules in rules_db.items()
+    }
+
+def explanation_texts() -> list:
+    """Every explanation check_eligibility can return that doesn't carry a user value (for TTS pre-rendering)."""
+    load_rules()
+    out = []
+    for _, rules in _compiled.values():
+        for cr in rules:
+            for text in (cr.pass_hi, cr.fail_hi, cr.missing_hi, cr.unclear_hi):
+                if text and text not in out:
+                    out.append(text)
+    return out
+
 
 def check_eligibility(scheme_id: str, profile: dict):
     """
@@ -127,14 +205,13 @@ def check_eligibility(scheme_id: str, profile: dict):
         "checks": [{"ok": true/false/None, "explain_hi": "..."}]
       }
     """
-    rules_db = load_rules()
-    scheme_rules = rules_db.get(scheme_id)
+    load_rules()
+    compiled = _compiled.get(scheme_id)
 
-    if not scheme_rules:
+    if not compiled:
         return {"status": "unknown", "missing_fields": [], "checks": []}
 
-    required_fields = scheme_rules.get("required_fields", [])
-    rules = scheme_rules.get("rules", [])
+    required_fields, rules = compiled
 
     missing = []
     checks = []
@@ -145,39 +222,26 @@ def check_eligibility(scheme_id: str, profile: dict):
         if f not in profile or profile.get(f) in [None, ""]:
             missing.append(f)
 
-    # rule checks
+    # rule checks (explanations were formatted when the rules loaded)
     for r in rules:
-        field = r.get("field")
-        op = r.get("op")
-        val = r.get("value")
+        field = r.field
 
         # If field missing, mark unknown with a helpful message
         if field not in profile or profile.get(field) in [None, ""]:
             missing.append(field)
-            checks.append({
-                "ok": None,
-                "explain_hi": f"⚠️ {_field_hi(field)} की जानकारी चाहिए।"
-            })
+            checks.append({"ok": None, "explain_hi": r.missing_hi})
             continue
 
-        ok = _compare(op, profile.get(field), val)
-
-        # Build dynamic explanation (PASS/FAIL)
-        # If your rules JSON has custom strings, we use them:
-        pass_msg = r.get("pass_hi")
-        fail_msg = r.get("fail_hi")
+        ok = _compare(r.op, profile.get(field), r.value)
 
         if ok is True:
-            explain = pass_msg or f"✅ शर्त पूरी: {_field_hi(field)} ठीक है।"
+            explain = r.pass_hi
         elif ok is False:
             failed = True
             # show requirement + user's value
-            explain = fail_msg or (
-                f"❌ शर्त पूरी नहीं: {_field_hi(field)} ({profile.get(field)}) "
-                f"{op} {val} होना चाहिए।"
-            )
+            explain = r.fail_text(profile.get(field))
         else:
-            explain = f"⚠️ {_field_hi(field)} की जानकारी/फॉर्मेट स्पष्ट नहीं है।"
+            explain = r.unclear_hi
 
         checks.append({"ok": ok, "explain_hi": explain})
 
@@ -194,6 +258,254 @@ def check_eligibility(scheme_id: str, profile: dict):
     return {"status": status, "missing_fields": missing, "checks": checks}
 
 
+# ----------------------------
+# Rule index (eligibility-first candidates)
+# ----------------------------
+# Which schemes a profile passes, without running every rule: schemes are bits
+# of an int, numeric thresholds are sorted per (field, op) with prefix/suffix
+# ORs of the schemes each threshold fails, and categorical rules are dicts from
+# the normalized value to a mask. A lookup is one bisect or dict hit per profile
+# field. Keys follow _compare exactly; rules it can't mirror (contains,
+# numeric ==, text that looks like a number/yes-no) put their scheme in
+# `residual`, which is checked with check_eligibility as before.
+_ORDER_OPS = ("<", "<=", ">", ">=")
+
+
+def _is_number(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _is_plain_text(v) -> bool:
+    return isinstance(v, str) and _to_bool(v) is None and _to_number(v) is None
+
+
+def _bool_key(x):
+    """A profile value as _compare sees it against a True/False rule value (None: matches neither)."""
+    b = _to_bool(x)
+    if b is None:
+        n = _to_number(x)
+        if n in (0.0, 1.0):
+            b = n == 1.0
+    return b
+
+
+class _Thresholds:
+    """Rules `field <op> value` for one (field, op); fails(x) is the mask of schemes x fails."""
+
+    def __init__(self, op: str, rules):
+        self.op = op
+        self.all = 0
+        by_value = {}
+        for value, bit in rules:
+            by_value[float(value)] = by_value.get(float(value), 0) | bit
+            self.all |= bit
+        self.values = sorted(by_value)
+        masks = [by_value[v] for v in self.values]
+        # prefix[i]: OR of masks[:i]; suffix[i]: OR of masks[i:]
+        self.prefix, self.suffix = [0], [0] * (len(masks) + 1)
+        for m in masks:
+            self.prefix.append(self.prefix[-1] | m)
+        for i in range(len(masks) - 1, -1, -1):
+            self.suffix[i] = self.suffix[i + 1] | masks[i]
+
+    def slot(self, x) -> int:
+        """Where x falls among the thresholds; values in the same slot pass and fail the same rules."""
+        if x is None:
+            return -1
+        if self.op in ("<=", ">"):
+            return bisect.bisect_left(self.values, x)
+        return bisect.bisect_right(self.values, x)
+
+    def fails(self, x) -> int:
+        i = self.slot(x)
+        if i < 0:
+            return self.all  # _compare: not a number -> the rule fails
+        # "<=" fails where value < x, "<" where value <= x: a prefix;
+        # ">=" fails where value > x, ">" where value >= x: a suffix
+        return self.prefix[i] if self.op in ("<=", "<") else self.suffix[i]
+
+
+class _Categorical:
+    """==/!= (and in/not_in) rules on one field under one key function."""
+
+    def __init__(self):
+        self.eq_all = 0
+        self.eq_ok = {}    # key -> schemes whose every == rule on the field is this key
+        self.ne_fail = {}  # key -> schemes with a != rule on this key
+        self._eq = {}      # scheme bit -> set of allowed keys while building
+
+    def add_eq(self, keys, bit: int):
+        self.eq_all |= bit
+        self._eq[bit] = set(keys) if bit not in self._eq else self._eq[bit] & set(keys)
+
+    def add_ne(self, keys, bit: int):
+        for k in keys:
+            self.ne_fail[k] = self.ne_fail.get(k, 0) | bit
+
+    def finish(self):
+        for bit, keys in self._eq.items():
+            for k in keys:
+                self.eq_ok[k] = self.eq_ok.get(k, 0) | bit
+        self._eq = None
+        return self
+
+    def fails(self, key) -> int:
+        return (self.eq_all & ~self.eq_ok.get(key, 0)) | self.ne_fail.get(key, 0)
+
+    def slot(self, key):
+        """key if some rule names it; every other key passes and fails the same rules (None)."""
+        return key if key in self.eq_ok or key in self.ne_fail else None
+
+
+class RuleIndex:
+    def __init__(self, compiled: dict):
+        self.scheme_ids = sorted(compiled)
+        self.all = (1 << len(self.scheme_ids)) - 1
+        self.needs = {}       # field -> schemes that need it (required field or rule)
+        self.numeric = {}     # field -> [_Thresholds, ...]
+        self.text = {}        # field -> _Categorical keyed by _norm_text
+        self.boolean = {}     # field -> _Categorical keyed by _bool_key
+        self.residual = 0
+        self.residual_fields = set()  # fields of rules the index can't mirror
+        ordered = {}
+        for i, scheme_id in enumerate(self.scheme_ids):
+            bit = 1 << i
+            required, rules = compiled[scheme_id]
+            for f in required:
+                self.needs[f] = self.needs.get(f, 0) | bit
+            for r in rules:
+                self.needs[r.field] = self.needs.get(r.field, 0) | bit
+                if not self._add(r, bit, ordered):
+                    self.residual |= bit
+                    self.residual_fields.add(r.field)
+        for field, by_op in ordered.items():
+            self.numeric[field] = [_Thresholds(op, rules) for op, rules in by_op.items()]
+        for cat in list(self.text.values()) + list(self.boolean.values()):
+            cat.finish()
+        self.residual_fields = tuple(sorted(self.residual_fields))
+
+    def _add(self, r, bit: int, ordered: dict) -> bool:
+        op, v = r.op, r.value
+        if op in _ORDER_OPS and _is_number(v):
+            ordered.setdefault(r.field, {}).setdefault(op, []).append((v, bit))
+        elif op in ("==", "!=") and isinstance(v, bool):
+            cat = self.boolean.setdefault(r.field, _Categorical())
+            (cat.add_eq if op == "==" else cat.add_ne)([v], bit)
+        elif op in ("==", "!=") and _is_plain_text(v):
+            cat = self.text.setdefault(r.field, _Categorical())
+            (cat.add_eq if op == "==" else cat.add_ne)([_norm_text(v)], bit)
+        elif op in ("in", "not_in") and isinstance(v, (list, tuple, set)):
+            cat = self.text.setdefault(r.field, _Categorical())
+            (cat.add_eq if op == "in" else cat.add_ne)([_norm_text(x) for x in v], bit)
+        else:
+            return False
+        return True
 
-
-
+    def masks(self, profile: dict):
+        """(passes, missing): schemes every indexed rule passes / schemes lacking a field."""
+        missing = fails = 0
+        for field, need in self.needs.items():
+            if field not in profile or profile.get(field) in [None, ""]:
+                missing |= need
+        present = {f: v for f, v in profile.items() if v not in [None, ""]}
+        for field, groups in self.numeric.items():
+            if field in present:
+                x = _to_number(present[field])
+                for g in groups:
+                    fails |= g.fails(x)
+        for field, cat in self.text.items():
+            if field in present:
+                fails |= cat.fails(_norm_text(present[field]))
+        for field, cat in self.boolean.items():
+            if field in present:
+                fails |= cat.fails(_bool_key(present[field]))
+        return self.all & ~fails, missing
+
+    def outcomes(self, profile: dict) -> tuple:
+        """
+        Hashable key for every rule's outcome on this profile: which fields are
+        missing, the threshold slot of each numeric field, the categorical key
+        when a rule names it, and the exact value for residual rules. Profiles
+        with equal keys get the same check_eligibility result for every scheme,
+        except the user value quoted in fail texts (requote() swaps that in).
+        """
+        present = {f: v for f, v in profile.items() if v not in [None, ""]}
+        key = [tuple(f in present for f in self.needs)]
+        for field, groups in self.numeric.items():
+            if field in present:
+                x = _to_number(present[field])
+                key.append(tuple(g.slot(x) for g in groups))
+            else:
+                key.append(None)
+        for field, cat in self.text.items():
+            key.append(cat.slot(_norm_text(present[field])) if field in present else None)
+        for field, cat in self.boolean.items():
+            key.append(cat.slot(_bool_key(present[field])) if field in present else None)
+        for field in self.residual_fields:
+            key.append(json.dumps(present.get(field), ensure_ascii=False, sort_keys=True, default=str))
+        return tuple(key)
+
+    def _ids(self, mask: int) -> set:
+        out = set()
+        while mask:
+            low = mask & -mask
+            out.add(self.scheme_ids[low.bit_length() - 1])
+            mask ^= low
+        return out
+
+    def eligible(self, profile: dict) -> set:
+        """Scheme ids check_eligibility would call "eligible" for this profile."""
+        passes, missing = self.masks(profile)
+        ok = passes & ~missing & ~self.residual
+        out = self._ids(ok)
+        for scheme_id in self._ids(self.residual & passes & ~missing):
+            if check_eligibility(scheme_id, profile)["status"] == "eligible":
+                out.add(scheme_id)
+        return out
+
+    def possible(self, profile: dict) -> set:
+        """Schemes that aren't "not_eligible": eligible, or still missing a field."""
+        passes, missing = self.masks(profile)
+        maybe = passes | missing  # check_eligibility reports missing fields before failed rules
+        out = self._ids(maybe & ~self.residual)
+        for scheme_id in self._ids(self.residual & maybe):
+            if check_eligibility(scheme_id, profile)["status"] != "not_eligible":
+                out.add(scheme_id)
+        return out
+
+
+def rule_index() -> RuleIndex:
+    """Index over the current rules; rebuilt after rules.json changes."""
+    global _index
+    load_rules()
+    index = _index
+    if index is None:
+        with _rules_lock:
+            if _index is None:
+                _index = RuleIndex(_compiled)
+            index = _index
+    return index
+
+
+def eligible_schemes(profile: dict) -> set:
+    return rule_index().eligible(profile)
+
+
+def requote(scheme_id: str, result: dict, profile: dict) -> dict:
+    """
+    check_eligibility(scheme_id, profile), given its result for another profile
+    with the same RuleIndex.outcomes(): only fail texts quoting the user's
+    value can differ. `result` is not modified.
+    """
+    compiled = _compiled.get(scheme_id)
+    if not compiled:
+        return result
+    checks = None
+    for i, (r, c) in enumerate(zip(compiled[1], result["checks"])):
+        if c["ok"] is False and not r.fail_hi:
+            text = r.fail_text(profile.get(r.field))
+            if text != c["explain_hi"]:
+                if checks is None:
+                    checks = list(result["checks"])
+                checks[i] = {"ok": False, "explain_hi": text}
+    return result if checks is None else {**result, "checks": checks}
@@ -1,8 +1,10 @@
 import json
+import threading
 from pathlib import Path
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
+from telemetry import span
 
 DATA_PATH = Path("data/schemes.jsonl")
 INDEX_PATH = Path("data/faiss.index")
@@ -11,6 +13,9 @@ META_PATH = Path("data/meta.json")
 _model = None
 _index = None
 _meta = None
+_by_id = None
+_catalogue_version = 0
+_load_lock = threading.Lock()  # index, meta and version change together
 
 def _load_model():
     global _model
@@ -47,36 +52,91 @@ def build_index():
     faiss.write_index(index, str(INDEX_PATH))
     with open(META_PATH, "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
+    reload_index()
+
+def reload_index():
+    """Drop the loaded index/meta; the next search picks up the new catalogue."""
+    global _index, _meta, _by_id
+    with _load_lock:
+        _index = None
+        _meta = None
+        _by_id = None
 
 def _load_index():
-    global _index, _meta
-    if _index is None or _meta is None:
-        if not INDEX_PATH.exists() or not META_PATH.exists():
-            build_index()
-        _index = faiss.read_index(str(INDEX_PATH))
-        with open(META_PATH, "r", encoding="utf-8") as f:
-            _meta = json.load(f)
-    return _index, _meta
+    global _index, _meta, _catalogue_version
+    index, meta = _index, _meta
+    if index is not None and meta is not None:
+        return index, meta
+    if not INDEX_PATH.exists() or not META_PATH.exists():
+        build_index()
+    with _load_lock:
+        if _index is None or _meta is None:
+            index = faiss.read_index(str(INDEX_PATH))
+            with open(META_PATH, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            _index, _meta = index, meta
+            _catalogue_version += 1
+        return _index, _meta
+
+def preload():
+    """Load the encoder and index without running them (prefork: no torch/OpenMP threads before fork)."""
+    _load_model()
+    _load_index()
+
+def catalogue_version() -> int:
+    """Bumped every time the index/meta are (re)loaded; part of result cache keys."""
+    _load_index()
+    with _load_lock:
+        return _catalogue_version
 
 def search_schemes(query_hi: str, top_k: int = 5):
     model = _load_model()
     index, meta = _load_index()
 
-    q = model.encode([query_hi], normalize_embeddings=True)
-    q = np.array(q, dtype="float32")
+    with span("retrieval.encode"):
+        q = model.encode([query_hi], normalize_embeddings=True)
+        q = np.array(q, dtype="float32")
 
-    scores, ids = index.search(q, top_k)
+    with span("retrieval.search", top_k=top_k):
+        scores, ids = index.search(q, top_k)
     results = []
     for score, idx in zip(scores[0], ids[0]):
         if idx == -1:
             continue
-        s = meta[idx]
-        results.append({
-            "scheme_id": s["scheme_id"],
-            "name_hi": s["name_hi"],
-            "summary_hi": s["summary_hi"],
-            "apply_hi": s.get("apply_hi", ""),
-            "documents_hi": s.get("documents_hi", []),
-            "score": float(score),
-        })
+        results.append(_result(meta[idx], float(score)))
     return results
+
+def _result(s, score=None):
+    r = {
+        "scheme_id": s["scheme_id"],
+        "name_hi": s["name_hi"],
+        "summary_hi": s["summary_hi"],
+        "apply_hi": s.get("apply_hi", ""),
+        "documents_hi": s.get("documents_hi", []),
+    }
+    if score is not None:
+        r["score"] = score
+    return r
+
+def get_scheme(scheme_id: str):
+    """
+    Same dict shape as a search result (without score), looked up by id.
+    Used to rehydrate compact session records; doesn't need the encoder.
+    """
+    global _by_id
+    if _by_id is None:
+        if _meta is not None:
+            schemes = _meta
+        elif META_PATH.exists():
+            with open(META_PATH, "r", encoding="utf-8") as f:
+                schemes = json.load(f)
+        else:
+            schemes = _load_schemes()
+        _by_id = {s["scheme_id"]: s for s in schemes}
+    s = _by_id.get(scheme_id)
+    return _result(s) if s else None
+
+def schemes():
+    """The whole catalogue (result dict shape, no score), in index order."""
+    _, meta = _load_index()
+    return [_result(s) for s in meta]
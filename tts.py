@@ -0,0 +1,180 @@
+import os
+import re
+import sys
+import threading
+import numpy as np
+from tts_cache import TTSCache, CACHE_DIR, cache_key
+from telemetry import span
+import tts_backends
+
+# Kept apart from speech.py so text-only entry points can speak without loading Whisper.
+
+_TTS_BACKEND = tts_backends.TTS_BACKEND
+_tts_cache = TTSCache(CACHE_DIR / _TTS_BACKEND, suffix=tts_backends.AUDIO_SUFFIX[_TTS_BACKEND])
+
+# Output profile per connection: "full" is the backend's own file (gTTS mp3 /
+# espeak wav); the others are low-bitrate Opus/Ogg, transcoded once and cached
+# next to it, so a 2G caller downloads a fraction of the bytes before playback.
+TTS_PROFILES = {
+    "full": None,
+    "3g": os.getenv("TTS_OPUS_3G_BITRATE", "24k"),
+    "2g": os.getenv("TTS_OPUS_2G_BITRATE", "12k"),
+}
+TTS_DEFAULT_PROFILE = os.getenv("TTS_DEFAULT_PROFILE", "full")
+TTS_PRERENDER_PROFILES = [p for p in os.getenv("TTS_PRERENDER_PROFILES", "full,3g,2g").split(",") if p]
+
+# streamed replies are cut at sentence/line ends into chunks of at most this many characters
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "160"))
+
+_profile_caches = {}
+_profile_lock = threading.Lock()
+_warned_no_ffmpeg = False
+
+
+def resolve_profile(profile=None) -> str:
+    """Known profile name, or "full" when Opus was asked for but ffmpeg is missing."""
+    global _warned_no_ffmpeg
+    profile = profile if profile in TTS_PROFILES else TTS_DEFAULT_PROFILE
+    if TTS_PROFILES.get(profile) and not tts_backends.can_transcode():
+        if not _warned_no_ffmpeg:
+            _warned_no_ffmpeg = True
+            print(f"tts: {tts_backends.FFMPEG_BIN} not found, low-bandwidth profiles fall back to full", file=sys.stderr)
+        return "full"
+    return profile if profile in TTS_PROFILES else "full"
+
+
+def _cache_for(profile: str) -> TTSCache:
+    if profile == "full":
+        return _tts_cache
+    cache = _profile_caches.get(profile)
+    if cache is None:
+        with _profile_lock:
+            cache = _profile_caches.get(profile)
+            if cache is None:
+                cache = _profile_caches[profile] = TTSCache(CACHE_DIR / f"{_TTS_BACKEND}-{profile}", suffix=".ogg")
+    return cache
+
+
+def _render(text: str, language_code: str):
+    def write(path):
+        with open(path, "wb") as f:
+            f.write(tts_backends.synthesize(text, language_code, _TTS_BACKEND))
+    return write
+
+
+def _native_file(text: str, language_code: str):
+    key = cache_key(text, language_code, _TTS_BACKEND)
+    path = _tts_cache.get(key)
+    return path or _tts_cache.put(key, _render(text, language_code)), bool(path)
+
+
+def _transcode(native: str, bitrate: str):
+    def write(path):
+        with open(path, "wb") as f:
+            f.write(tts_backends.transcode_opus(native, bitrate))
+    return write
+
+
+def tts_to_file(text: str, language_code: str, profile: str = "full") -> str:
+    """
+    Returns a path to an audio file (mp3 for gtts, wav for espeak, ogg for the
+    low-bandwidth profiles).
+    gTTS language codes: hi, bn, ta, te, mr, or, gu, kn, ml, pa, ur...
+    Audio is cached by (text, language, voice[, profile]), so repeated replies skip synthesis.
+    """
+    if not text:
+        text = " "
+
+    profile = resolve_profile(profile)
+    with span("tts", backend=_TTS_BACKEND, profile=profile) as sp:
+        if profile == "full":
+            path, hit = _native_file(text, language_code)
+            sp.set(cache="hit" if hit else "miss")
+            return path
+
+        cache = _cache_for(profile)
+        key = cache_key(text, language_code, f"{_TTS_BACKEND}/{profile}")
+        path = cache.get(key)
+        sp.set(cache="hit" if path else "miss")
+        if path:
+            return path
+        native, _ = _native_file(text, language_code)
+        return cache.put(key, _transcode(native, TTS_PROFILES[profile]))
+
+
+def tts_audio(text: str, language_code: str):
+    """
+    Same as tts_to_file, but returns (sample_rate, float32 samples) so Gradio
+    can play it straight from memory.
+    """
+    path = tts_to_file(text, language_code)
+    with span("tts.decode", backend=_TTS_BACKEND):
+        return tts_backends.decode(path)
+
+
+def tts_audio_concat(chunks, language_code: str):
+    """
+    tts_audio for a reply made of separately cached pieces: each piece's clip is
+    decoded and the samples joined, so only pieces never heard before are synthesized.
+    """
+    clips = [tts_audio(c, language_code) for c in chunks if c and c.strip()]
+    if not clips:
+        return tts_audio(" ", language_code)
+    rate = clips[0][0]
+    if any(sr != rate for sr, _ in clips):
+        return tts_audio(" ".join(c for c in chunks if c), language_code)
+    return rate, np.concatenate([data for _, data in clips])
+
+
+_SENTENCE_END = re.compile(r"(?<=[।?!.])\s+|\s*\n+\s*")
+
+
+def split_for_tts(text: str, max_chars: int = TTS_CHUNK_CHARS) -> list:
+    """
+    Reply -> chunks to synthesize and stream one by one. The first sentence is
+    its own chunk (time to first audio); the rest is packed up to max_chars.
+    """
+    parts = [p.strip() for p in _SENTENCE_END.split(text or "") if p and p.strip()]
+    if not parts:
+        return [" "]
+    chunks = [parts[0]]
+    for p in parts[1:]:
+        if len(chunks) > 1 and len(chunks[-1]) + 1 + len(p) <= max_chars:
+            chunks[-1] += " " + p
+        else:
+            chunks.append(p)
+    return chunks
+
+
+def streamable(profile: str) -> bool:
+    """Chunks can be played back to back only in frame-based formats (mp3, Ogg/Opus), not wav."""
+    profile = resolve_profile(profile)
+    return profile != "full" or tts_backends.AUDIO_SUFFIX[_TTS_BACKEND] != ".wav"
+
+
+def prerender_tts(texts, language_codes, profiles=None, chunked: bool = False):
+    """
+    Warm the TTS cache (fixed agent prompts x UI languages x output profiles).
+    chunked: render the pieces split_for_tts() makes, as streamed replies request them.
+    Errors are skipped.
+    """
+    profiles = {resolve_profile(p) for p in (profiles or TTS_PRERENDER_PROFILES)}
+    done = 0
+    for lang in language_codes:
+        for text in texts:
+            for piece in (split_for_tts(text) if chunked else [text]):
+                for profile in profiles:
+                    try:
+                        tts_to_file(piece, lang, profile)
+                        done += 1
+                    except Exception:
+                        continue
+    return done
+
+
+def tts_stats() -> dict:
+    out = _tts_cache.stats()
+    out["backend"] = _TTS_BACKEND
+    for profile, cache in list(_profile_caches.items()):
+        out[profile] = cache.stats()
+    return out
@@ -0,0 +1,95 @@
+import io
+import os
+import shutil
+import subprocess
+import numpy as np
+import soundfile as sf
+
+# gtts   -> Google TTS (network round trip, mp3)
+# espeak -> espeak-ng on local CPU (offline, wav)
+TTS_BACKEND = os.getenv("TTS_BACKEND", "gtts")
+ESPEAK_BIN = os.getenv("ESPEAK_BIN", "espeak-ng")
+ESPEAK_RATE = os.getenv("ESPEAK_RATE", "150")  # words per minute
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+
+# file suffix of what each backend returns
+AUDIO_SUFFIX = {
+    "gtts": ".mp3",
+    "espeak": ".wav",
+}
+
+
+def _gtts(text: str, language_code: str) -> bytes:
+    from gtts import gTTS  # only needed for this backend
+
+    buf = io.BytesIO()
+    gTTS(text=text, lang=language_code).write_to_fp(buf)
+    return buf.getvalue()
+
+
+def _espeak(text: str, language_code: str) -> bytes:
+    # espeak-ng voices use the same ISO codes as the UI: hi, bn, ta, te, mr, or, gu, kn, ml, pa
+    if shutil.which(ESPEAK_BIN) is None:
+        raise RuntimeError(f"{ESPEAK_BIN} not found; install espeak-ng or use TTS_BACKEND=gtts")
+    r = subprocess.run(
+        [ESPEAK_BIN, "-v", language_code, "-s", ESPEAK_RATE, "--stdout", text],
+        capture_output=True,
+        timeout=30,
+        check=True,
+    )
+    return r.stdout
+
+
+_BACKENDS = {
+    "gtts": _gtts,
+    "espeak": _espeak,
+}
+
+
+def register_backend(name: str, fn, suffix: str):
+    """Add a backend fn(text, language_code) -> bytes; must happen before `tts` is imported."""
+    _BACKENDS[name] = fn
+    AUDIO_SUFFIX[name] = suffix
+
+
+def synthesize(text: str, language_code: str, backend: str = TTS_BACKEND) -> bytes:
+    """Encoded audio bytes (format: AUDIO_SUFFIX[backend])."""
+    fn = _BACKENDS.get(backend)
+    if fn is None:
+        raise ValueError(f"unknown TTS backend: {backend}")
+    return fn(text or " ", language_code)
+
+
+def decode(src):
+    """
+    bytes or file path -> (sample_rate, float32 mono samples),
+    which is what gr.Audio accepts without touching disk.
+    """
+    if isinstance(src, (bytes, bytearray)):
+        src = io.BytesIO(src)
+    data, sr = sf.read(src, dtype="float32", always_2d=False)
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    return sr, np.ascontiguousarray(data)
+
+
+def can_transcode() -> bool:
+    return shutil.which(FFMPEG_BIN) is not None
+
+
+def transcode_opus(src: str, bitrate: str) -> bytes:
+    """
+    Audio file -> Opus in Ogg, mono 16 kHz, tuned for speech. 12k is still
+    clear for a single voice and ~8x smaller than gTTS's 64 kbps MP3.
+    """
+    if not can_transcode():
+        raise RuntimeError(f"{FFMPEG_BIN} not found; install ffmpeg for low-bandwidth audio")
+    r = subprocess.run(
+        [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-i", src,
+         "-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", bitrate,
+         "-application", "voip", "-f", "ogg", "pipe:1"],
+        capture_output=True,
+        timeout=30,
+        check=True,
+    )
+    return r.stdout
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", "data/tts_cache"))
+CACHE_MAX_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+
+def cache_key(text: str, language_code: str, voice: str) -> str:
+    # content-addressed: same (text, language, voice) -> same audio file
+    h = hashlib.sha256()
+    h.update(f"{voice}\0{language_code}\0{text}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class TTSCache:
+    """
+    Size-bounded LRU cache of rendered audio files on disk.
+    Recency survives restarts through file mtimes (touched on every hit).
+    """
+
+    def __init__(self, root: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, suffix: str = ".mp3"):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, oldest first
+        self._bytes = 0
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = sorted(self.root.glob(f"*{suffix}"), key=lambda p: p.stat().st_mtime)
+        for p in files:
+            size = p.stat().st_size
+            self._entries[p.stem] = size
+            self._bytes += size
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}{self.suffix}"
+
+    def get(self, key: str):
+        """Path of the cached file, or None."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # deleted behind our back
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return str(path)
+
+    def put(self, key: str, render) -> str:
+        """
+        render(tmp_path) writes the audio file; it is moved into place
+        atomically, then least-recently-used entries are evicted.
+        """
+        path = self._path(key)
+        # unique per call: prefork workers share the cache dir (thread idents repeat across processes)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=f"{key}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            render(tmp)
+            os.chmod(tmp, 0o644)  # mkstemp creates 0600; cached clips are served like any other file
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)  # failed render (network, espeak, ffmpeg): no orphan .tmp left behind
+            except FileNotFoundError:
+                pass
+            raise
+        size = path.stat().st_size
+
+        evict = []
+        with self._lock:
+            self._bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old, old_size = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                evict.append(old)
+        for old in evict:
+            try:
+                self._path(old).unlink()
+            except FileNotFoundError:
+                pass
+        return str(path)
+
+    def get_or_render(self, key: str, render) -> str:
+        return self.get(key) or self.put(key, render)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }